@@ -1,9 +1,23 @@
 import os
-import traceback
-from flask import Flask, render_template, send_from_directory, request, jsonify
+import logging
+from flask import Flask, render_template, send_from_directory, request, jsonify, Response, stream_with_context
 from backend.emotion_analyzer import EmotionAnalyzer
 from backend.sentence_generator import SentenceGenerator
 from backend.logging_service import LoggingService
+from backend.job_queue import JobQueue
+from backend.document_cache import DocumentCache
+from backend.static_assets import StaticAssetManager
+from backend.metrics_service import metrics
+from backend.profiling_service import profiler
+from backend.admin_auth import require_admin_token
+from backend.response_format import dumps, to_compact, COMPACT_ENCODINGS
+
+# Verbose output is off by default; set LOG_LEVEL=DEBUG or INFO to enable it
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "WARNING").upper(),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+)
+logger = logging.getLogger(__name__)
 
 # Initialize Flask app
 app = Flask(__name__, template_folder='./frontend', static_folder='./frontend')
@@ -16,85 +30,239 @@ sentence_generator = SentenceGenerator(
 )
 logging_service = LoggingService(base_dir="user_logs")
 
+# Limits for /analyze/batch; larger corpora should go through /jobs
+MAX_BATCH_DOCUMENTS = 1000
+MAX_BATCH_CHARS = 1_000_000
+MAX_BATCH_REQUEST_BYTES = 4 * MAX_BATCH_CHARS  # UTF-8 plus JSON overhead
+# Documents analyzed together per chunk when streaming /analyze/batch results
+STREAM_CHUNK_DOCUMENTS = 32
+# Limits for /jobs submissions, which are persisted to disk
+MAX_JOB_DOCUMENTS = 10_000
+MAX_JOB_CHARS = 50_000_000
+MAX_JOB_REQUEST_BYTES = 4 * MAX_JOB_CHARS  # UTF-8 plus JSON overhead
+job_queue = JobQueue(analyzer, base_dir="analysis_jobs")
+document_cache = DocumentCache(max_bytes=64 * 1024 * 1024)
+# Content-hashed, precompressed frontend assets built once at startup
+static_assets = StaticAssetManager(os.path.join(os.path.dirname(__file__), 'frontend'))
+
+# Start the background job workers once; the debug reloader's parent process only supervises
+if __name__ != '__main__' or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+    job_queue.start()
+
 # Helper function for standardized error responses
 def error_response(message, status_code=400):
-    print(f"Error: {message}")
+    logger.warning("Error: %s", message)
     return jsonify({"error": message}), status_code
 
 # Helper function for standardized success responses
 def success_response(data):
     return jsonify(data)
 
+# Helper for large responses, serialized with the fast JSON encoder
+def json_response(data, status_code=200):
+    with metrics.span("serialization"):
+        body = dumps(data)
+    return Response(body, status=status_code, mimetype="application/json")
+
+# Helper for cacheable /analyze bodies carrying their ETag
+def cached_body_response(body, etag):
+    response = Response(body, mimetype="application/json")
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
 # Helper for exception handling in routes
 def handle_endpoint_exception(e, endpoint_name):
     error_msg = f"An error occurred during {endpoint_name}: {str(e)}"
-    print(error_msg)
-    print(traceback.format_exc())
+    metrics.increment("request_errors", endpoint=endpoint_name)
+    logger.exception(error_msg)
     return error_response(error_msg, 500)
 
 # Route for the main HTML page.
 @app.route('/')
 def index():
+    # index.html references the hashed asset names; it is revalidated on every load
+    if app.debug:
+        static_assets.refresh()
+    if static_assets.has('index.html'):
+        return static_assets.response('index.html', request)
     return render_template('index.html')
 
 # Route to serve static CSS and JS files.
 @app.route('/<path:filename>')
 def serve_files(filename):
+    # The reloader only watches .py files, so pick up frontend edits here while developing
+    if app.debug:
+        static_assets.refresh()
+    if static_assets.has(filename):
+        return static_assets.response(filename, request)
     frontend_folder = os.path.join(os.path.dirname(__file__), 'frontend')
     return send_from_directory(frontend_folder, filename)
 
 # Endpoint to analyze text dynamically.
 @app.route('/analyze', methods=['POST'])
+@profiler.profile_endpoint("analyze")
 def analyze():
+    metrics.increment("requests", endpoint="analyze")
     try:
-        data = request.json
-        text = data.get("text", "").strip()
+        with metrics.span("request_parse"):
+            data = request.json
+            text = DocumentCache.normalize(data.get("text", ""))
+            # Optional compact format: label header + packed score matrix
+            response_format = data.get("format", "full")
+            encoding = data.get("encoding", "base64")
         if not text:
             return error_response("No text provided")
+        if response_format not in ("full", "compact"):
+            return error_response(f"Unknown response format '{response_format}'")
+        if encoding not in COMPACT_ENCODINGS:
+            return error_response(f"Unknown compact encoding '{encoding}'")
 
-        print("Starting analysis of text:", text[:100], "...")
-        analysis = analyzer.analyze_dynamic_text(text)
-        
-        if not analysis or not analysis["results"]:
-            print("Warning: No results returned from analyzer")
-            return error_response("No valid results could be generated")
+        # The ETag only depends on the text, model and format, so a match needs no work at all
+        with metrics.span("document_cache_lookup"):
+            cache_key = document_cache.make_key(text, analyzer.model_version, response_format, encoding)
+            etag = DocumentCache.etag(cache_key)
+            # Only an explicit tag proves the client holds this analysis; `*` must not match
+            if etag in request.if_none_match.as_set(include_weak=True):
+                metrics.increment("not_modified_responses")
+                response = Response(status=304)
+                response.set_etag(etag)
+                return response
+            cached_body = document_cache.get(cache_key)
+        if cached_body is not None:
+            return cached_body_response(cached_body, etag)
 
-        print(f"Analysis complete, returning {len(analysis['results'])} results")
-        
-        # Include structured data in the response
-        return success_response({
-            "results": analysis["results"],
-            "structured_data": analysis.get("structured_data", {})
-        })
+        logger.debug("Starting analysis of text: %s ...", text[:100])
+        if response_format == "compact":
+            # Score straight into the matrix, the per-sentence dicts are never needed
+            with metrics.span("analyze_total"):
+                structure = analyzer.segment_text(text)
+                sentences = [s['sentence'] for s in structure['sentences']]
+                matrix = analyzer.analyze_matrix(sentences) if sentences else None
+
+            if matrix is None:
+                logger.warning("No sentences found in submitted text")
+                return error_response("No valid results could be generated")
+
+            logger.debug("Analysis complete, returning %d results", len(sentences))
+            payload = to_compact(structure, matrix['labels'], matrix['scores'], encoding=encoding)
+        else:
+            with metrics.span("analyze_total"):
+                analysis = analyzer.analyze_dynamic_text(text)
+
+            if not analysis or not analysis["results"]:
+                logger.warning("No results returned from analyzer")
+                return error_response("No valid results could be generated")
+
+            logger.debug("Analysis complete, returning %d results", len(analysis['results']))
+            # Include structured data in the response
+            payload = {
+                "results": analysis["results"],
+                "structured_data": analysis.get("structured_data", {})
+            }
+
+        with metrics.span("serialization"):
+            body = dumps(payload)
+        document_cache.put(cache_key, body)
+        return cached_body_response(body, etag)
         
     except Exception as e:
         return handle_endpoint_exception(e, "analysis")
 
+# Endpoint to analyze many documents per request with shared model batches.
+@app.route('/analyze/batch', methods=['POST'])
+@profiler.profile_endpoint("analyze_batch")
+def analyze_batch():
+    metrics.increment("requests", endpoint="analyze_batch")
+    try:
+        # Reject oversized bodies before Flask reads them
+        if request.content_length is not None and request.content_length > MAX_BATCH_REQUEST_BYTES:
+            return error_response(f"Request body exceeds {MAX_BATCH_REQUEST_BYTES} bytes", 413)
+
+        with metrics.span("request_parse"):
+            data = request.json or {}
+            documents = data.get("documents")
+            stream = bool(data.get("stream", False))
+        if not documents or not isinstance(documents, list):
+            return error_response("A non-empty list of documents must be provided")
+
+        ids, texts = [], []
+        for idx, doc in enumerate(documents):
+            if isinstance(doc, dict):
+                ids.append(doc.get("id", idx))
+                doc = doc.get("text")
+            else:
+                ids.append(idx)
+            if not isinstance(doc, str):
+                return error_response(f"Document {idx} must be a string or an object with a 'text' field")
+            texts.append(doc.strip())
+
+        if len(texts) > MAX_BATCH_DOCUMENTS:
+            return error_response(f"At most {MAX_BATCH_DOCUMENTS} documents are allowed per request", 413)
+        if sum(len(text) for text in texts) > MAX_BATCH_CHARS:
+            return error_response(f"Total text length exceeds {MAX_BATCH_CHARS} characters", 413)
+
+        if not stream:
+            with metrics.span("analyze_total"):
+                analyses = analyzer.analyze_documents(texts)
+            return json_response({
+                "documents": [{"id": doc_id, **analysis} for doc_id, analysis in zip(ids, analyses)]
+            })
+
+        # Stream one JSON line per document as each chunk of documents is analyzed
+        def generate():
+            for start in range(0, len(texts), STREAM_CHUNK_DOCUMENTS):
+                chunk = texts[start:start + STREAM_CHUNK_DOCUMENTS]
+                try:
+                    with metrics.span("analyze_total"):
+                        analyses = analyzer.analyze_documents(chunk)
+                except Exception as e:
+                    logger.exception("Batch analysis failed")
+                    yield dumps({"error": f"An error occurred during batch analysis: {e}"}) + b"\n"
+                    return
+                for offset, analysis in enumerate(analyses):
+                    yield dumps({"index": start + offset, "id": ids[start + offset], **analysis}) + b"\n"
+
+        return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+    except Exception as e:
+        return handle_endpoint_exception(e, "batch analysis")
+
 # Endpoint to modify a selected sentence based on new emotion levels.
 @app.route("/modify", methods=["POST"])
+@profiler.profile_endpoint("modify")
 def modify_sentence():
+    metrics.increment("requests", endpoint="modify")
     try:
-        data = request.json
-        print("Received data for modification:", data)
-        original_sentence = data.get("sentence", "").strip()
-        new_emotion_levels = data.get("new_emotions")
+        with metrics.span("request_parse"):
+            data = request.json
+            original_sentence = data.get("sentence", "").strip()
+            new_emotion_levels = data.get("new_emotions")
+            # Optional rewrite backend: "openai", "lexicon" or "paraphrase"
+            backend_name = data.get("backend")
+        logger.debug("Received data for modification: %s", data)
 
         if not original_sentence or not new_emotion_levels:
             return error_response("Sentence and new_emotions must be provided")
 
-        print("/modify endpoint triggered")
+        try:
+            backend = sentence_generator.get_backend(backend_name)
+        except ValueError as e:
+            return error_response(str(e))
+
         # Generate the modified sentence
-        new_sentence = sentence_generator.generate_modified_sentence(original_sentence, new_emotion_levels)
+        with metrics.span("modify_total"):
+            new_sentence = sentence_generator.generate_modified_sentence(
+                original_sentence, new_emotion_levels, backend=backend.name
+            )
 
-        # Analyze the emotions of the generated sentence
-        actual_emotions = analyzer.analyze_emotions(new_sentence)
+        # Analyze the top 3 emotions of the generated sentence
+        top_actual_emotions = analyzer.top_emotions(new_sentence, k=3)
         
         # Normalize the top 3 actual emotions to two decimal places
-        top_actual_emotions = dict(sorted(actual_emotions.items(), key=lambda x: x[1], reverse=True)[:3])
         normalized_top_actual_emotions = {k: round(v, 2) for k, v in top_actual_emotions.items()}
         
-        print("Sentence modification complete:", new_sentence)
-        print("Top 3 actual emotions (normalized):", normalized_top_actual_emotions)
+        logger.debug("Sentence modification complete: %s", new_sentence)
+        logger.debug("Top 3 actual emotions (normalized): %s", normalized_top_actual_emotions)
         
         # Return the new sentence and its emotion levels
         return success_response({
@@ -107,8 +275,8 @@ def modify_sentence():
 # Endpoint to handle file uploads for analysis.
 @app.route("/upload", methods=["POST"])
 def upload():
+    metrics.increment("requests", endpoint="upload")
     try:
-        print("/upload endpoint triggered")
         if 'file' not in request.files:
             return error_response("No file provided")
 
@@ -120,14 +288,74 @@ def upload():
         if not content.strip():
             return error_response("Uploaded file is empty")
 
-        print(f"File received: {file.filename}")
-        print("Calling EmotionsAnalyzer...")
-        results = analyzer.analyze_dynamic_text(content)
-        print("Analysis complete")
+        logger.debug("File received: %s", file.filename)
+        with metrics.span("analyze_total"):
+            results = analyzer.analyze_dynamic_text(content)
         return success_response({"results": results["results"]})
     except Exception as e:
         return handle_endpoint_exception(e, "file upload")
 
+# Endpoint to submit a bulk analysis job (JSON documents or uploaded files)
+@app.route("/jobs", methods=["POST"])
+def submit_job():
+    try:
+        # Reject oversized bodies before Flask reads them
+        if request.content_length is not None and request.content_length > MAX_JOB_REQUEST_BYTES:
+            return error_response(f"Request body exceeds {MAX_JOB_REQUEST_BYTES} bytes", 413)
+
+        if request.files:
+            documents = []
+            for f in request.files.getlist('files') + request.files.getlist('file'):
+                try:
+                    documents.append({"id": f.filename, "text": f.read().decode('utf-8')})
+                except UnicodeDecodeError:
+                    return error_response(f"File {f.filename} is not valid UTF-8 text")
+        else:
+            data = request.json or {}
+            documents = data.get("documents")
+        if not documents or not isinstance(documents, list):
+            return error_response("A non-empty list of documents must be provided")
+
+        if len(documents) > MAX_JOB_DOCUMENTS:
+            return error_response(f"At most {MAX_JOB_DOCUMENTS} documents are allowed per job", 413)
+        total_chars = 0
+        for doc in documents:
+            text = doc.get("text") if isinstance(doc, dict) else doc
+            total_chars += len(text) if isinstance(text, str) else 0
+        if total_chars > MAX_JOB_CHARS:
+            return error_response(f"Total text length exceeds {MAX_JOB_CHARS} characters", 413)
+
+        try:
+            status = job_queue.submit(documents)
+        except ValueError as e:
+            return error_response(str(e))
+        return success_response(status), 202
+    except Exception as e:
+        return handle_endpoint_exception(e, "job submission")
+
+# Endpoint to poll the status and progress of a bulk analysis job
+@app.route("/jobs/<job_id>", methods=["GET"])
+def get_job_status(job_id):
+    status = job_queue.get_status(job_id)
+    if status is None:
+        return error_response(f"Job {job_id} not found", 404)
+    return success_response(status)
+
+# Endpoint to fetch the (possibly partial) results of a bulk analysis job
+@app.route("/jobs/<job_id>/results", methods=["GET"])
+def get_job_results(job_id):
+    try:
+        status = job_queue.get_status(job_id)
+        if status is None:
+            return error_response(f"Job {job_id} not found", 404)
+        return json_response({
+            "status": status["status"],
+            "progress": status["progress"],
+            "documents": job_queue.get_results(job_id)
+        })
+    except Exception as e:
+        return handle_endpoint_exception(e, "retrieving job results")
+
 # Endpoint to handle interaction logs
 @app.route("/log-interaction", methods=["POST"])
 def log_interaction():
@@ -137,7 +365,8 @@ def log_interaction():
             return error_response("No logs provided")
         
         # Store logs with logging service
-        num_logs = logging_service.store_logs(logs)
+        with metrics.span("log_write"):
+            num_logs = logging_service.store_logs(logs)
         
         return success_response({
             "success": True, 
@@ -146,11 +375,11 @@ def log_interaction():
     except Exception as e:
         return handle_endpoint_exception(e, "log processing")
 
-# Endpoint to retrieve user logs (protected, for admin use)
+# Endpoint to retrieve user logs (requires the admin token)
 @app.route("/admin/user-logs/<user_id>", methods=["GET"])
+@require_admin_token
 def get_user_logs(user_id):
     try:
-        # In a real application, add authentication here
         limit = request.args.get('limit', 100, type=int)
         logs = logging_service.get_user_logs(user_id, limit=limit)
         return success_response({"logs": logs, "count": len(logs)})
@@ -159,15 +388,56 @@ def get_user_logs(user_id):
 
 # Endpoint to get emotion statistics
 @app.route("/admin/emotion-stats", methods=["GET"])
+@require_admin_token
 def get_emotion_stats():
     try:
-        # In a real application, add authentication here
         user_id = request.args.get('user_id')
         stats = logging_service.get_emotion_delta_stats(user_id=user_id)
         return success_response(stats)
     except Exception as e:
         return handle_endpoint_exception(e, "retrieving emotion statistics")
 
+# Endpoint to inspect or toggle request profiling (requires the admin token)
+@app.route("/admin/profiling", methods=["GET", "POST"])
+@require_admin_token
+def profiling_config():
+    try:
+        if request.method == "POST":
+            data = request.json or {}
+            try:
+                config = profiler.configure(
+                    enabled=data.get("enabled"),
+                    sample_rate=data.get("sample_rate"),
+                    allow_header=data.get("allow_header")
+                )
+            except ValueError as e:
+                return error_response(str(e))
+            return success_response(config)
+        return success_response(profiler.get_config())
+    except Exception as e:
+        return handle_endpoint_exception(e, "profiling configuration")
+
+# Endpoint to list stored request profiles (requires the admin token)
+@app.route("/admin/profiles", methods=["GET"])
+@require_admin_token
+def list_profiles():
+    profiles = profiler.list_profiles()
+    return success_response({"profiles": profiles, "count": len(profiles)})
+
+# Endpoint to retrieve a single stored request profile (requires the admin token)
+@app.route("/admin/profiles/<profile_id>", methods=["GET"])
+@require_admin_token
+def get_profile(profile_id):
+    profile = profiler.get_profile(profile_id)
+    if profile is None:
+        return error_response(f"Profile {profile_id} not found", 404)
+    return success_response(profile)
+
+# Endpoint exposing stage latencies and counters in Prometheus text format
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    return Response(metrics.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
 # Optional: Serve backend files (for debugging or additional resources).
 @app.route('/backend/<path:filename>')
 def backend_files(filename):
@@ -0,0 +1,37 @@
+import os
+import hmac
+from functools import wraps
+
+ADMIN_TOKEN_ENV = "ADMIN_TOKEN"
+ADMIN_TOKEN_HEADER = "X-Admin-Token"
+
+
+def get_admin_token():
+    """Configured admin token, or an empty string when admin access is disabled."""
+    return os.getenv(ADMIN_TOKEN_ENV, "").strip()
+
+
+def is_admin_request(headers):
+    """Whether the request carries the configured admin token."""
+    expected = get_admin_token()
+    if not expected or headers is None:
+        return False
+    provided = headers.get(ADMIN_TOKEN_HEADER, "")
+    auth = headers.get("Authorization", "")
+    if not provided and auth.startswith("Bearer "):
+        provided = auth[len("Bearer "):]
+    return hmac.compare_digest(provided.strip().encode("utf-8"), expected.encode("utf-8"))
+
+
+def require_admin_token(func):
+    """Decorator for Flask views that are only reachable with the admin token."""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        # Imported here so the module stays usable outside a Flask app
+        from flask import request, jsonify
+        if not get_admin_token():
+            return jsonify({"error": "Admin endpoints are disabled, set ADMIN_TOKEN to enable them"}), 403
+        if not is_admin_request(request.headers):
+            return jsonify({"error": "Invalid or missing admin token"}), 401
+        return func(*args, **kwargs)
+    return wrapper
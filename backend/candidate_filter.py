@@ -0,0 +1,97 @@
+import re
+import zlib
+import numpy as np
+
+_MERSENNE_PRIME = (1 << 31) - 1
+# MinHash estimates are noisy, so they only preselect pairs for the exact check
+_PRESELECT_MARGIN = 0.1
+
+
+class CandidateDeduplicator:
+    def __init__(self, similarity_threshold=0.97, shingle_size=2, num_perm=64, seed=13):
+        """
+        Collapse identical and near-identical candidate sentences.
+        Similarity is measured on whole-word shingles, so rewrites that swap even a
+        single (emotion) word stay distinct unless the sentence is very long.
+        :param similarity_threshold: Jaccard similarity above which two candidates are duplicates.
+        :param shingle_size: Number of consecutive words per shingle.
+        :param num_perm: Number of MinHash permutations per signature.
+        """
+        self.similarity_threshold = similarity_threshold
+        self.shingle_size = shingle_size
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, _MERSENNE_PRIME, size=num_perm, dtype=np.int64)
+        self._b = rng.randint(0, _MERSENNE_PRIME, size=num_perm, dtype=np.int64)
+
+    def normalize(self, text):
+        """Lowercase, drop punctuation and collapse whitespace."""
+        text = re.sub(r"[^\w\s]", "", text.lower())
+        return " ".join(text.split())
+
+    def shingles(self, normalized):
+        """Set of word n-grams of a normalized text."""
+        words = normalized.split()
+        k = self.shingle_size
+        return {" ".join(words[i:i + k]) for i in range(max(1, len(words) - k + 1))}
+
+    def signature(self, shingles):
+        """MinHash signature over a set of shingles."""
+        hashes = np.array([zlib.crc32(s.encode('utf-8')) & _MERSENNE_PRIME for s in shingles], dtype=np.int64)
+        return ((self._a[:, None] * hashes[None, :] + self._b[:, None]) % _MERSENNE_PRIME).min(axis=1)
+
+    def similarity(self, sig_a, sig_b):
+        """Estimated Jaccard similarity of two signatures."""
+        return float(np.mean(sig_a == sig_b))
+
+    def _is_near_duplicate(self, shingles, sig, kept):
+        for other_shingles, other_sig in kept:
+            if self.similarity(sig, other_sig) < self.similarity_threshold - _PRESELECT_MARGIN:
+                continue
+            overlap = len(shingles & other_shingles) / len(shingles | other_shingles)
+            if overlap >= self.similarity_threshold:
+                return True
+        return False
+
+    def filter(self, candidates, seeds=()):
+        """
+        Keep one candidate of each group of duplicate candidates.
+        :param seeds: Sentences the candidates were generated from; copies of them
+                      never displace a rewritten variant.
+        :return: (unique candidates, stats dict with dropped counts)
+        """
+        seed_texts = {self.normalize(seed) for seed in seeds}
+        normalized = [(candidate, self.normalize(candidate)) for candidate in candidates]
+        # Stable sort: variants first, copies of the seeds only when nothing similar was kept
+        normalized.sort(key=lambda item: item[1] in seed_texts)
+
+        stats = {'exact': 0, 'near': 0}
+        seen_texts = set()
+        kept, kept_shingles = [], []
+        for candidate, text in normalized:
+            if text in seen_texts:
+                stats['exact'] += 1
+                continue
+            seen_texts.add(text)
+
+            shingles = self.shingles(text)
+            sig = self.signature(shingles)
+            if self._is_near_duplicate(shingles, sig, kept_shingles):
+                stats['near'] += 1
+                continue
+            kept.append(candidate)
+            kept_shingles.append((shingles, sig))
+        return kept, stats
+
+    def select_diverse(self, ranked, limit, key=lambda item: item):
+        """Pick up to `limit` items from a ranked list, skipping near-duplicates of items already picked."""
+        picked, picked_shingles = [], []
+        for item in ranked:
+            shingles = self.shingles(self.normalize(key(item)))
+            sig = self.signature(shingles)
+            if self._is_near_duplicate(shingles, sig, picked_shingles):
+                continue
+            picked.append(item)
+            picked_shingles.append((shingles, sig))
+            if len(picked) >= limit:
+                break
+        return picked
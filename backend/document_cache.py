@@ -0,0 +1,65 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from backend.metrics_service import metrics
+
+
+class DocumentCache:
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        """
+        LRU cache of serialized whole-document responses, bounded by total size.
+        :param max_bytes: Maximum total size of the cached response bodies.
+        """
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(text):
+        """Normalize text so equivalent submissions share a cache entry."""
+        return text.replace('\r\n', '\n').replace('\r', '\n').strip()
+
+    def make_key(self, text, model_version, *variant):
+        """Content hash of the normalized text, the model version and the response variant."""
+        digest = hashlib.sha256()
+        for part in (model_version, *variant):
+            digest.update(str(part).encode('utf-8'))
+            digest.update(b'\0')
+        digest.update(self.normalize(text).encode('utf-8'))
+        return digest.hexdigest()
+
+    @staticmethod
+    def etag(key):
+        """Strong ETag value (unquoted) for a cache key."""
+        return key[:32]
+
+    def get(self, key):
+        """Return the cached body for a key (marking it recently used) or None."""
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+        metrics.increment("document_cache_hits" if body is not None else "document_cache_misses")
+        return body
+
+    def put(self, key, body):
+        """Store a serialized body, evicting least recently used entries to stay within max_bytes."""
+        size = len(body)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.current_bytes -= len(previous)
+            self._entries[key] = body
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= len(evicted)
+                metrics.increment("document_cache_evictions")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
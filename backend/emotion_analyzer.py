@@ -1,10 +1,16 @@
+import logging
+import threading
 import spacy
 from flask import Flask, request, jsonify
 from transformers import AutoTokenizer, AutoModelForSequenceClassification, pipeline
 import torch
-from functools import lru_cache
+from collections import OrderedDict
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from multiprocessing import cpu_count
+from backend.metrics_service import metrics
+from backend.profiling_service import profiler
+
+logger = logging.getLogger(__name__)
 
 class EmotionAnalyzer:
     # Class-level variable to track if the model has been loaded
@@ -21,9 +27,15 @@ class EmotionAnalyzer:
         self.process_delay = 0.1
         max_workers = max(1, cpu_count() - 1)
         self.thread_executor = ThreadPoolExecutor(max_workers=max_workers)        
-        self._cache = {}
+        # Bounded LRU of sentence -> score tensor row; label dicts are derived from it
+        self.cache_size = 50000
+        self._score_cache = OrderedDict()
+        self._cache_lock = threading.Lock()
         self.tokenizer = None
         self.model = None
+        # The fast tokenizer and the model are shared by request threads and
+        # background job workers; concurrent tokenizer calls are not safe
+        self._model_lock = threading.Lock()
         self.emotion_labels = None
         
         # Load the model when app initializes
@@ -32,12 +44,12 @@ class EmotionAnalyzer:
     def _initialize_model(self):
         """Load model only if not already loaded"""
         if not EmotionAnalyzer._is_model_loaded:
-            print(f"Loading model '{self.model_name}'...")
+            logger.info("Loading model '%s'...", self.model_name)
             self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
             self.model = AutoModelForSequenceClassification.from_pretrained(self.model_name).to(self.device)
             self.model.eval()
             self.emotion_labels = list(self.model.config.id2label.values())
-            print(f"Model loaded successfully on {self.device}")
+            logger.info("Model loaded successfully on %s", self.device)
             
             if torch.cuda.is_available():
                 self._process_batch(["warmup text"])  # Warmup run for CUDA
@@ -56,42 +68,68 @@ class EmotionAnalyzer:
         """Alias for _initialize_model"""
         self._initialize_model()
 
-    @lru_cache(maxsize=1024)
+    @property
+    def model_version(self):
+        """Model name plus the resolved checkpoint revision, used to key cached results."""
+        commit = getattr(self.model.config, "_commit_hash", None) if self.model is not None else None
+        return f"{self.model_name}@{commit or 'unknown'}"
+
     def _analyze_single(self, sentence):
         """Analyze a single sentence with caching."""
-        # Ensure model is loaded before first use
-        if not EmotionAnalyzer._is_model_loaded:
-            self._initialize_model()
-            
-        if sentence in self._cache:
-            return self._cache[sentence]
-        inputs = self.tokenizer(sentence, return_tensors="pt", padding=True, truncation=True).to(self.device)
-        with torch.no_grad():
-            outputs = self.model(**inputs)
-            predictions = torch.softmax(outputs.logits, dim=-1)[0]
-            result = {self.emotion_labels[i]: float(score) for i, score in enumerate(predictions)}
-            self._cache[sentence] = result
-            return result
+        return self._process_batch([sentence])[0]
 
-    def _process_batch(self, batch):
-        """Process a batch of sentences."""
+    def _score_rows(self, sentences):
+        """Return a (len(sentences), num_labels) float32 CPU tensor of emotion scores."""
         # Ensure model is loaded before first use
         if not EmotionAnalyzer._is_model_loaded:
             self._initialize_model()
-            
-        cached_results = [self._cache[sent] for sent in batch if sent in self._cache]
-        uncached_sentences = [sent for sent in batch if sent not in self._cache]
 
-        if uncached_sentences:
-            inputs = self.tokenizer(uncached_sentences, return_tensors="pt", padding=True, truncation=True).to(self.device)
+        rows = {}
+        unique_sentences = list(dict.fromkeys(sentences))
+        with metrics.span("score_cache_lookup"), self._cache_lock:
+            for sent in unique_sentences:
+                row = self._score_cache.get(sent)
+                if row is not None:
+                    self._score_cache.move_to_end(sent)
+                    rows[sent] = row
+        uncached_sentences = [sent for sent in unique_sentences if sent not in rows]
+        # Counted per distinct sentence, repeats within one input are not cache hits
+        metrics.increment("analyzer_cache_hits", len(rows))
+        metrics.increment("analyzer_cache_misses", len(uncached_sentences))
+
+        for i in range(0, len(uncached_sentences), self.batch_size):
+            chunk = uncached_sentences[i:i + self.batch_size]
+            with self._model_lock:
+                with metrics.span("tokenization"):
+                    inputs = self.tokenizer(chunk, return_tensors="pt", padding=True, truncation=True).to(self.device)
+                with torch.no_grad(), metrics.span("forward_pass"), profiler.torch_span():
+                    outputs = self.model(**inputs)
             with torch.no_grad():
-                outputs = self.model(**inputs)
-                predictions = torch.softmax(outputs.logits, dim=-1)
-                for sent, pred in zip(uncached_sentences, predictions):
-                    emotions = {self.emotion_labels[i]: float(score) for i, score in enumerate(pred)}
-                    self._cache[sent] = emotions
-                    cached_results.append(emotions)
-        return cached_results
+                predictions = torch.softmax(outputs.logits, dim=-1).float().cpu()
+            with self._cache_lock:
+                for sent, pred in zip(chunk, predictions):
+                    # Clone so a cached row does not keep the whole batch tensor alive
+                    rows[sent] = self._score_cache[sent] = pred.clone()
+                while len(self._score_cache) > self.cache_size:
+                    self._score_cache.popitem(last=False)
+
+        if not sentences:
+            return torch.empty((0, len(self.emotion_labels)))
+        return torch.stack([rows[sent] for sent in sentences])
+
+    def _process_batch(self, batch):
+        """Process a batch of sentences, returning one label->score dict per sentence."""
+        if not batch:
+            return []
+        rows = self._score_rows(batch).tolist()
+        return [dict(zip(self.emotion_labels, row)) for row in rows]
+
+    def score_sentences(self, sentences):
+        """
+        Score a list of sentences in shared model batches.
+        :return: One label->score dict per sentence, in input order.
+        """
+        return self._process_batch(list(sentences))
 
     def _process_batch_parallel(self, sentences):
         """Process sentences in parallel using thread pool."""
@@ -114,43 +152,87 @@ class EmotionAnalyzer:
             return {}
         return self._process_batch([sentence])[0]
 
-    def preserve_text_structure(self, text):
-        """Process text while preserving original structure including paragraph breaks"""
-        # Split text into paragraphs while preserving empty lines
-        paragraphs = text.split('\n')
-        
+    def analyze_matrix(self, sentences):
+        """
+        Score many sentences at once without building per-label dicts.
+        :param sentences: List of sentence strings.
+        :return: Dict with the label header and a (sentences x labels) float32 numpy matrix.
+        """
+        scores = self._score_rows(list(sentences))
+        return {"labels": list(self.emotion_labels), "scores": scores.numpy()}
+
+    def analyze_top_k(self, sentences, k=3, threshold=None):
+        """
+        Return only the strongest emotions per sentence, selected on the score tensor.
+        :param sentences: List of sentence strings.
+        :param k: Number of labels kept per sentence, or None to keep all labels above threshold.
+        :param threshold: Optional minimum score for a label to be kept.
+        :return: One {label: score} dict per sentence, ordered by descending score.
+        """
+        scores = self._score_rows(list(sentences))
+        if scores.shape[0] == 0:
+            return []
+        k = scores.shape[1] if k is None else min(k, scores.shape[1])
+        values, indices = torch.topk(scores, k, dim=-1)
+        values, indices = values.tolist(), indices.tolist()
+
+        results = []
+        for row_values, row_indices in zip(values, indices):
+            top = {}
+            for value, index in zip(row_values, row_indices):
+                if threshold is not None and value < threshold:
+                    break  # Values are sorted, the rest are below threshold too
+                top[self.emotion_labels[index]] = value
+            results.append(top)
+        return results
+
+    def top_emotions(self, sentence, k=3, threshold=None):
+        """Top-k emotions for a single sentence."""
+        if not sentence or not sentence.strip():
+            return {}
+        return self.analyze_top_k([sentence], k=k, threshold=threshold)[0]
+
+    def segment_text(self, text):
+        """Split text into paragraphs and sentences without scoring them"""
+        return self.segment_documents([text])[0]
+
+    def segment_documents(self, texts, batch_size=64):
+        """Segment many texts at once, parsing all paragraphs through spaCy's pipe"""
+        # Split texts into paragraphs while preserving empty lines
+        paragraphs_per_text = [text.split('\n') for text in texts]
+        non_empty = [p for paragraphs in paragraphs_per_text for p in paragraphs if p.strip()]
+        with metrics.span("segmentation"):
+            parsed = iter(list(self.spacy_nlp.pipe(non_empty, batch_size=batch_size)))
+        return [self._build_structure(paragraphs, parsed) for paragraphs in paragraphs_per_text]
+
+    def _build_structure(self, paragraphs, parsed):
+        """Build the structured text of one document from its parsed paragraphs"""
         processed_paragraphs = []
         sentence_data = []
         sentence_id = 0
         
         for para_idx, paragraph in enumerate(paragraphs):
             if paragraph.strip():  # Non-empty paragraph
-                doc = self.spacy_nlp(paragraph)
+                doc = next(parsed)
                 processed_sentences = []
                 
                 for sent in doc.sents:
                     sentence_text = sent.text.strip()
                     # Skip empty sentences
                     if sentence_text and sentence_text != '\n' and not sentence_text.isspace():
-                        # Use existing emotion analysis
-                        emotions = self.analyze_emotions(sentence_text)
+                        sentence_data.append({
+                            'sentence': sentence_text,
+                            'paragraph_id': para_idx,
+                            'sentence_id': sentence_id,
+                            'start_char': sent.start_char,
+                            'end_char': sent.end_char
+                        })
                         
-                        # Only add if emotions were successfully analyzed
-                        if emotions:
-                            sentence_data.append({
-                                'sentence': sentence_text,
-                                'emotions': emotions,
-                                'paragraph_id': para_idx,
-                                'sentence_id': sentence_id,
-                                'start_char': sent.start_char,
-                                'end_char': sent.end_char
-                            })
-                            
-                            processed_sentences.append({
-                                'id': sentence_id,
-                                'text': sentence_text
-                            })
-                            sentence_id += 1
+                        processed_sentences.append({
+                            'id': sentence_id,
+                            'text': sentence_text
+                        })
+                        sentence_id += 1
                 
                 if processed_sentences:  # Only add paragraph if it has valid sentences
                     processed_paragraphs.append({
@@ -169,25 +251,37 @@ class EmotionAnalyzer:
             'sentences': sentence_data
         }
 
-    def analyze_dynamic_text(self, text):
-        """Analyze a block of text dynamically with structure preservation."""
-        if not text or not text.strip():
-            return {"results": [], "progress": {"processed": 0, "total": 0}}
+    def preserve_text_structure(self, text):
+        """Process text while preserving original structure including paragraph breaks"""
+        structured_result = self.segment_text(text)
+        sentence_data = structured_result['sentences']
         
-        # Use structured text processing
-        structured_result = self.preserve_text_structure(text)
+        # Score all sentences of the document in shared batches
+        emotions = self._process_batch([s['sentence'] for s in sentence_data])
+        for sentence, sentence_emotions in zip(sentence_data, emotions):
+            sentence['emotions'] = sentence_emotions
         
+        return structured_result
+
+    @staticmethod
+    def format_results(sentence_data):
+        """Flat per-sentence results as returned by analyze_dynamic_text."""
+        return [
+            {
+                'sentence': s['sentence'],
+                'emotions': s['emotions'],
+                'paragraph_id': s['paragraph_id']  # Include paragraph info
+            }
+            for s in sentence_data
+        ]
+
+    def _build_analysis(self, structured_result):
+        """Wrap a scored structure in the analyze_dynamic_text response format."""
         if not structured_result['sentences']:
             return {"results": [], "progress": {"processed": 0, "total": 0}}
         
         # Return results with both flat and structured formats
-        results = []
-        for sentence_data in structured_result['sentences']:
-            results.append({
-                'sentence': sentence_data['sentence'],
-                'emotions': sentence_data['emotions'],
-                'paragraph_id': sentence_data['paragraph_id']  # Include paragraph info
-            })
+        results = self.format_results(structured_result['sentences'])
         
         return {
             "results": results,
@@ -195,11 +289,35 @@ class EmotionAnalyzer:
             "progress": {"processed": len(results), "total": len(results)}
         }
 
+    def analyze_dynamic_text(self, text):
+        """Analyze a block of text dynamically with structure preservation."""
+        if not text or not text.strip():
+            return {"results": [], "progress": {"processed": 0, "total": 0}}
+        
+        # Use structured text processing
+        return self._build_analysis(self.preserve_text_structure(text))
+
+    def analyze_documents(self, texts):
+        """
+        Analyze many texts together: segmentation goes through one spaCy pipe and
+        all sentences are scored in shared model batches.
+        :return: One analyze_dynamic_text-style result per text, in input order.
+        """
+        structures = self.segment_documents([text or "" for text in texts])
+        all_sentences = [s for structure in structures for s in structure['sentences']]
+        
+        emotions = self._process_batch([s['sentence'] for s in all_sentences])
+        for sentence, sentence_emotions in zip(all_sentences, emotions):
+            sentence['emotions'] = sentence_emotions
+        
+        return [self._build_analysis(structure) for structure in structures]
+
     def split_text_into_sentences(self, text):
         """
         Splits text into sentences using spaCy.
         """
-        doc = self.spacy_nlp(text)
+        with metrics.span("segmentation"):
+            doc = self.spacy_nlp(text)
         sentences = []
         
         for sent in doc.sents:
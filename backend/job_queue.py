@@ -0,0 +1,276 @@
+import os
+import json
+import time
+import uuid
+import queue
+import logging
+import threading
+from pathlib import Path
+from backend.metrics_service import metrics
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows, where jobs are not claimed across processes
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+PENDING_STATES = ("queued", "running")
+
+
+class JobQueue:
+    def __init__(self, analyzer, base_dir="analysis_jobs", num_workers=1, batch_size=64, segment_window=256):
+        """
+        Persistent queue for bulk document analysis.
+        Every job lives in its own directory under base_dir:
+          - documents.json: the submitted documents
+          - status.json: job state and progress counters
+          - results.jsonl: checkpoint lines with the scored sentences of one document each
+          - worker.lock: held by the process that is currently running the job
+        :param analyzer: Shared EmotionAnalyzer instance.
+        :param base_dir: Directory where jobs are persisted.
+        :param num_workers: Number of background worker threads.
+        :param batch_size: Number of sentences scored (and checkpointed) at once, across documents.
+        :param segment_window: Number of documents segmented together and pooled into batches.
+        """
+        self.analyzer = analyzer
+        self.base_dir = Path(base_dir)
+        self.base_dir.mkdir(exist_ok=True, parents=True)
+        self.num_workers = num_workers
+        self.batch_size = batch_size
+        self.segment_window = segment_window
+        self._queue = queue.Queue()
+        self._status_lock = threading.Lock()
+        self._workers = []
+
+    def start(self):
+        """Requeue unfinished jobs from a previous run and start the workers."""
+        if self._workers:
+            return
+        for job_dir in sorted(self.base_dir.iterdir(), key=lambda p: p.stat().st_mtime):
+            status = self._read_json(job_dir / "status.json")
+            if status and status.get('status') in PENDING_STATES:
+                logger.info("Resuming analysis job %s", status['id'])
+                self._queue.put(status['id'])
+
+        for i in range(self.num_workers):
+            worker = threading.Thread(target=self._worker_loop, name=f"analysis-job-worker-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(self, documents):
+        """
+        Persist a new job and enqueue it.
+        :param documents: List of strings or dicts with 'text' and an optional 'id'.
+        :return: The initial job status.
+        """
+        normalized = []
+        for idx, doc in enumerate(documents):
+            if isinstance(doc, str):
+                doc = {'text': doc}
+            if not isinstance(doc, dict) or not isinstance(doc.get('text'), str):
+                raise ValueError(f"Document {idx} must be a string or an object with a 'text' field")
+            normalized.append({'id': doc.get('id', idx), 'text': doc['text']})
+
+        job_id = uuid.uuid4().hex
+        job_dir = self.base_dir / job_id
+        job_dir.mkdir()
+        self._write_json(job_dir / "documents.json", normalized)
+
+        status = {
+            'id': job_id,
+            'status': 'queued',
+            'created': time.time(),
+            'updated': time.time(),
+            'error': None,
+            'progress': {
+                'processed': 0,
+                'total': len(normalized),
+                'sentences_processed': 0
+            }
+        }
+        self._write_json(job_dir / "status.json", status)
+        metrics.increment("jobs_submitted")
+        self._queue.put(job_id)
+        return status
+
+    def get_status(self, job_id):
+        """Return the job status or None if the job does not exist."""
+        job_dir = self._job_dir(job_id)
+        if job_dir is None:
+            return None
+        return self._read_json(job_dir / "status.json")
+
+    def get_results(self, job_id):
+        """
+        Return the per-document results checkpointed so far, in the format of
+        analyze_dynamic_text's 'results' list.
+        """
+        job_dir = self._job_dir(job_id)
+        if job_dir is None:
+            return None
+        documents = self._read_json(job_dir / "documents.json") or []
+        # Keyed by sentence id, so sentences checkpointed twice are only returned once
+        per_document = {idx: {} for idx in range(len(documents))}
+        for entry in self._read_checkpoints(job_dir):
+            for sentence in entry['sentences']:
+                per_document[entry['document']].setdefault(sentence['sentence_id'], sentence)
+
+        results = []
+        for idx, doc in enumerate(documents):
+            sentences = sorted(per_document[idx].values(), key=lambda s: s['sentence_id'])
+            results.append({
+                'id': doc['id'],
+                'results': self.analyzer.format_results(sentences)
+            })
+        return results
+
+    def _worker_loop(self):
+        while True:
+            job_id = self._queue.get()
+            try:
+                self._run_job(job_id)
+            except Exception as e:
+                logger.exception("Analysis job %s failed", job_id)
+                metrics.increment("jobs_failed")
+                self._update_status(job_id, status='failed', error=str(e))
+            finally:
+                self._queue.task_done()
+
+    def _run_job(self, job_id):
+        job_dir = self.base_dir / job_id
+        lock_file = self._claim(job_dir)
+        if lock_file is None:
+            logger.info("Analysis job %s is already being processed by another worker", job_id)
+            return
+        try:
+            self._process_job(job_id, job_dir)
+        finally:
+            lock_file.close()
+
+    def _process_job(self, job_id, job_dir):
+        status = self._read_json(job_dir / "status.json")
+        if status['status'] not in PENDING_STATES:
+            return  # Finished by another worker before we claimed it
+        documents = self._read_json(job_dir / "documents.json")
+
+        # Work out what was already checkpointed before a crash or restart
+        done = {}
+        for entry in self._read_checkpoints(job_dir):
+            done.setdefault(entry['document'], set()).update(s['sentence_id'] for s in entry['sentences'])
+        sentences_processed = sum(len(ids) for ids in done.values())
+        processed = 0
+        self._update_status(job_id, status='running', sentences_processed=sentences_processed)
+
+        with open(job_dir / "results.jsonl", 'a', encoding='utf-8') as checkpoint_file:
+            # Terminate a line left half-written by a crash before appending
+            if checkpoint_file.tell() > 0 and not self._ends_with_newline(job_dir / "results.jsonl"):
+                checkpoint_file.write('\n')
+
+            for start in range(0, len(documents), self.segment_window):
+                window = documents[start:start + self.segment_window]
+                segmented = self.analyzer.segment_documents([doc['text'] for doc in window])
+
+                # Pool the pending sentences of the whole window so batches span documents
+                pending, remaining = [], {}
+                for doc_idx, structure in enumerate(segmented, start):
+                    todo = [s for s in structure['sentences'] if s['sentence_id'] not in done.get(doc_idx, ())]
+                    remaining[doc_idx] = len(todo)
+                    pending.extend((doc_idx, s) for s in todo)
+                processed += sum(1 for count in remaining.values() if count == 0)
+
+                for i in range(0, len(pending), self.batch_size):
+                    batch = pending[i:i + self.batch_size]
+                    emotions = self.analyzer.score_sentences([s['sentence'] for _, s in batch])
+                    per_document = {}
+                    for (doc_idx, sentence), sentence_emotions in zip(batch, emotions):
+                        sentence['emotions'] = sentence_emotions
+                        per_document.setdefault(doc_idx, []).append(sentence)
+
+                    for doc_idx, sentences in per_document.items():
+                        checkpoint_file.write(json.dumps({'document': doc_idx, 'sentences': sentences}) + '\n')
+                        remaining[doc_idx] -= len(sentences)
+                        if remaining[doc_idx] == 0:
+                            processed += 1
+                    checkpoint_file.flush()
+                    os.fsync(checkpoint_file.fileno())
+
+                    sentences_processed += len(batch)
+                    self._update_status(job_id, processed=processed, sentences_processed=sentences_processed)
+
+                # Also reports documents that needed no scoring at all
+                self._update_status(job_id, processed=processed)
+
+        self._update_status(job_id, status='completed')
+        metrics.increment("jobs_completed")
+
+    def _claim(self, job_dir):
+        """
+        Lock a job directory for this worker. The lock is held as long as the
+        returned file is open and is released automatically if the process dies.
+        :return: The open lock file, or None if another process holds the job.
+        """
+        lock_file = open(job_dir / "worker.lock", 'a')
+        if fcntl is None:
+            return lock_file
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return None
+        return lock_file
+
+    def _update_status(self, job_id, status=None, error=None, processed=None, sentences_processed=None):
+        status_path = self.base_dir / job_id / "status.json"
+        with self._status_lock:
+            current = self._read_json(status_path)
+            if status is not None:
+                current['status'] = status
+            if error is not None:
+                current['error'] = error
+            if processed is not None:
+                current['progress']['processed'] = processed
+            if sentences_processed is not None:
+                current['progress']['sentences_processed'] = sentences_processed
+            current['updated'] = time.time()
+            self._write_json(status_path, current)
+
+    def _job_dir(self, job_id):
+        # Job ids are generated hex strings; reject anything else to avoid path traversal
+        if not job_id or not all(c in "0123456789abcdef" for c in job_id):
+            return None
+        job_dir = self.base_dir / job_id
+        return job_dir if job_dir.is_dir() else None
+
+    def _read_checkpoints(self, job_dir):
+        path = job_dir / "results.jsonl"
+        if not path.exists():
+            return []
+        entries = []
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # A partially written last line from a crash is simply redone
+                    continue
+        return entries
+
+    def _ends_with_newline(self, path):
+        with open(path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b'\n'
+
+    def _read_json(self, path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def _write_json(self, path, data):
+        # Write to a temporary file first so a crash never leaves a truncated file
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
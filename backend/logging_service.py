@@ -1,9 +1,12 @@
 import os
 import json
+import logging
 import time
 from datetime import datetime
 from pathlib import Path
 
+logger = logging.getLogger(__name__)
+
 class LoggingService:
     def __init__(self, base_dir="user_logs"):
         """Initialize the logging service with a base directory for logs."""
@@ -119,7 +122,7 @@ class LoggingService:
                         except json.JSONDecodeError:
                             continue
             except Exception as e:
-                print(f"Error reading log file {log_file}: {e}")
+                logger.warning("Error reading log file %s: %s", log_file, e)
                 continue
         
         return logs[-limit:] if limit else logs
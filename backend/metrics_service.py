@@ -0,0 +1,117 @@
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Latency buckets (seconds) shared by all stage histograms
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class _Histogram:
+    """Cumulative bucket histogram in the Prometheus sense."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsService:
+    def __init__(self, namespace="emotion", buckets=DEFAULT_BUCKETS):
+        """Keep stage timings and counters in-process for the /metrics endpoint."""
+        self.namespace = namespace
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+
+    @contextmanager
+    def span(self, stage):
+        """Time the enclosed block and record it under the given stage name."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def observe(self, stage, seconds):
+        """Record a duration (in seconds) for a stage."""
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = _Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def increment(self, name, amount=1, **labels):
+        """Increment a counter, optionally split by labels."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def get_counter(self, name, **labels):
+        """Return the current value of a counter."""
+        with self._lock:
+            return self._counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def snapshot(self):
+        """Return a JSON-friendly view of all stage timings and counters."""
+        with self._lock:
+            stages = {
+                stage: {
+                    'count': h.count,
+                    'sum_seconds': h.sum,
+                    'avg_seconds': h.sum / h.count if h.count else 0.0
+                }
+                for stage, h in self._histograms.items()
+            }
+            counters = {}
+            for (name, labels), value in self._counters.items():
+                suffix = ",".join(f"{k}={v}" for k, v in labels)
+                counters[f"{name}{{{suffix}}}" if suffix else name] = value
+        return {'stages': stages, 'counters': counters}
+
+    def render_prometheus(self):
+        """Render all metrics in the Prometheus text exposition format."""
+        ns = self.namespace
+        lines = []
+        with self._lock:
+            if self._histograms:
+                metric = f"{ns}_stage_duration_seconds"
+                lines.append(f"# HELP {metric} Time spent in each processing stage.")
+                lines.append(f"# TYPE {metric} histogram")
+                for stage in sorted(self._histograms):
+                    h = self._histograms[stage]
+                    cumulative = 0
+                    for bound, count in zip(self.buckets, h.counts):
+                        cumulative += count
+                        lines.append(f'{metric}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                    lines.append(f'{metric}_bucket{{stage="{stage}",le="+Inf"}} {h.count}')
+                    lines.append(f'{metric}_sum{{stage="{stage}"}} {h.sum}')
+                    lines.append(f'{metric}_count{{stage="{stage}"}} {h.count}')
+
+            by_name = {}
+            for (name, labels), value in self._counters.items():
+                by_name.setdefault(name, []).append((labels, value))
+            for name in sorted(by_name):
+                metric = f"{ns}_{name}_total"
+                lines.append(f"# TYPE {metric} counter")
+                for labels, value in sorted(by_name[name]):
+                    label_str = ",".join(f'{k}="{v}"' for k, v in labels)
+                    lines.append(f"{metric}{{{label_str}}} {value}" if label_str else f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        """Drop all recorded metrics."""
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+
+# Shared instance used by the app and the backend modules
+metrics = MetricsService()
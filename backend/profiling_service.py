@@ -0,0 +1,192 @@
+import io
+import time
+import uuid
+import random
+import pstats
+import cProfile
+import logging
+import threading
+import contextvars
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from backend.admin_auth import is_admin_request
+
+try:
+    from pyinstrument import Profiler as SamplingProfiler
+except ImportError:  # pyinstrument is optional, cProfile is used instead
+    SamplingProfiler = None
+
+logger = logging.getLogger(__name__)
+
+# Profile record of the request currently being profiled on this context (if any)
+_active_record = contextvars.ContextVar("active_profile_record", default=None)
+
+
+class ProfilingService:
+    def __init__(self, enabled=False, sample_rate=0.0, allow_header=False, max_profiles=50):
+        """
+        Opt-in request profiler.
+        :param enabled: Whether sampled profiling of requests is switched on.
+        :param sample_rate: Fraction of requests (0-1) profiled while enabled.
+        :param allow_header: Whether an `X-Profile: 1` header forces profiling; it is
+            only honoured on requests that also carry the admin token.
+        :param max_profiles: Number of finished profiles kept in memory.
+        """
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.allow_header = allow_header
+        self.max_profiles = max_profiles
+        self.header_name = "X-Profile"
+        self._profiles = OrderedDict()
+        self._lock = threading.Lock()
+        # Only one request is profiled at a time, profilers do not nest well
+        self._busy = threading.Lock()
+
+    def configure(self, enabled=None, sample_rate=None, allow_header=None):
+        """
+        Update the profiling settings and return the current configuration.
+        All values are validated before any of them is applied.
+        :raises ValueError: If a value has the wrong type or is out of range.
+        """
+        for field, value in (('enabled', enabled), ('allow_header', allow_header)):
+            if value is not None and not isinstance(value, bool):
+                raise ValueError(f"'{field}' must be true or false")
+        if sample_rate is not None:
+            if isinstance(sample_rate, bool) or not isinstance(sample_rate, (int, float)):
+                raise ValueError("'sample_rate' must be a number")
+            if not 0.0 <= sample_rate <= 1.0:
+                raise ValueError("'sample_rate' must be between 0 and 1")
+
+        if enabled is not None:
+            self.enabled = enabled
+        if sample_rate is not None:
+            self.sample_rate = float(sample_rate)
+        if allow_header is not None:
+            self.allow_header = allow_header
+        return self.get_config()
+
+    def get_config(self):
+        return {
+            'enabled': self.enabled,
+            'sample_rate': self.sample_rate,
+            'allow_header': self.allow_header,
+            'sampler': 'pyinstrument' if SamplingProfiler else 'cProfile',
+            'stored_profiles': len(self._profiles)
+        }
+
+    def should_profile(self, headers=None):
+        """Decide whether the current request is profiled."""
+        if (self.allow_header and headers is not None and headers.get(self.header_name) == "1"
+                and is_admin_request(headers)):
+            return True
+        return self.enabled and self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def profile_endpoint(self, name):
+        """Decorator for Flask views that profiles the request when selected."""
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                # Imported here so the service stays usable outside a Flask app
+                from flask import request, make_response
+                if not self.should_profile(request.headers) or not self._busy.acquire(blocking=False):
+                    return func(*args, **kwargs)
+                try:
+                    with self.profile(name) as record:
+                        response = make_response(func(*args, **kwargs))
+                finally:
+                    self._busy.release()
+                # Let the caller fetch the profile from /admin/profiles/<id>
+                response.headers["X-Profile-Id"] = record['id']
+                return response
+            return wrapper
+        return decorator
+
+    @contextmanager
+    def profile(self, name):
+        """Profile the enclosed block and store the resulting report."""
+        record = {
+            'id': uuid.uuid4().hex[:12],
+            'endpoint': name,
+            'timestamp': time.time(),
+            'torch': []
+        }
+        token = _active_record.set(record)
+        if SamplingProfiler:
+            sampler = SamplingProfiler()
+            sampler.start()
+        else:
+            sampler = cProfile.Profile()
+            sampler.enable()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            if SamplingProfiler:
+                sampler.stop()
+            else:
+                sampler.disable()
+            record['duration'] = time.perf_counter() - start
+            _active_record.reset(token)
+            record['report'] = self._format_report(sampler)
+            self._store(record)
+            logger.info("Stored profile %s for %s (%.3fs)", record['id'], name, record['duration'])
+
+    def torch_span(self, label="forward_pass"):
+        """
+        Context manager for the model forward pass. Runs the torch profiler only
+        when the current request is being profiled, otherwise it is a no-op.
+        Forward passes run on executor threads do not inherit the request context
+        and are only visible in the Python profile of the request thread.
+        """
+        record = _active_record.get()
+        if record is None:
+            return nullcontext()
+        return self._torch_profile(record, label)
+
+    @contextmanager
+    def _torch_profile(self, record, label):
+        from torch.profiler import profile, ProfilerActivity
+        with profile(activities=[ProfilerActivity.CPU], record_shapes=True) as prof:
+            yield
+        record['torch'].append({
+            'label': label,
+            'table': prof.key_averages().table(sort_by="cpu_time_total", row_limit=20)
+        })
+
+    def _format_report(self, sampler, limit=40):
+        if SamplingProfiler:
+            return sampler.output_text(unicode=True, color=False)
+        stream = io.StringIO()
+        stats = pstats.Stats(sampler, stream=stream)
+        stats.sort_stats("cumulative").print_stats(limit)
+        return stream.getvalue()
+
+    def _store(self, record):
+        with self._lock:
+            self._profiles[record['id']] = record
+            while len(self._profiles) > self.max_profiles:
+                self._profiles.popitem(last=False)
+
+    def list_profiles(self):
+        """Return summaries of the stored profiles, newest first."""
+        with self._lock:
+            return [
+                {
+                    'id': r['id'],
+                    'endpoint': r['endpoint'],
+                    'timestamp': r['timestamp'],
+                    'duration': r['duration'],
+                    'torch_spans': len(r['torch'])
+                }
+                for r in reversed(self._profiles.values())
+            ]
+
+    def get_profile(self, profile_id):
+        """Return a full stored profile or None."""
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+
+# Shared instance used by the app and the backend modules
+profiler = ProfilingService()
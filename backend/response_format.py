@@ -0,0 +1,63 @@
+import json
+import base64
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, the stdlib encoder is used instead
+    orjson = None
+
+COMPACT_ENCODINGS = ("base64", "rounded")
+
+
+def dumps(payload):
+    """Serialize a response payload to UTF-8 JSON bytes, using orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(payload, separators=(",", ":")).encode("utf-8")
+
+
+def encode_score_matrix(matrix, encoding="base64", decimals=4):
+    """
+    Encode a (sentences x labels) score matrix.
+    :param matrix: 2D array-like of emotion scores.
+    :param encoding: 'base64' for little-endian float32 bytes, 'rounded' for nested lists.
+    :param decimals: Number of decimals kept with the 'rounded' encoding.
+    """
+    matrix = np.asarray(matrix, dtype="<f4")
+    if encoding == "base64":
+        return base64.b64encode(matrix.tobytes()).decode("ascii")
+    if encoding == "rounded":
+        # Round in float64 so the JSON holds the short decimal, not the float32 expansion
+        return np.round(matrix.astype(np.float64), decimals).tolist()
+    raise ValueError(f"Unknown compact encoding '{encoding}', expected one of {COMPACT_ENCODINGS}")
+
+
+def to_compact(structure, labels, matrix, encoding="base64", decimals=4):
+    """
+    Build the compact response format: a single label header, one score matrix
+    and the sentence metadata stored once.
+    :param structure: Segmented text as returned by EmotionAnalyzer.segment_text.
+    :param labels: Emotion labels, in matrix column order.
+    :param matrix: (sentences x labels) scores, e.g. from EmotionAnalyzer.analyze_matrix.
+    """
+    sentences = structure.get("sentences", [])
+    # Sentence texts are sent once, in `sentences`; the client rebuilds them by id
+    structured_text = [
+        {**element, 'sentences': [{'id': s['id']} for s in element['sentences']]}
+        if 'sentences' in element else element
+        for element in structure.get("structured_text", [])
+    ]
+
+    return {
+        "format": "compact",
+        "encoding": encoding,
+        "labels": list(labels),
+        "shape": [len(sentences), len(labels)],
+        "scores": encode_score_matrix(matrix, encoding, decimals),
+        "sentences": [
+            {k: v for k, v in s.items() if k != 'emotions'}
+            for s in sentences
+        ],
+        "structured_text": structured_text
+    }
@@ -0,0 +1,457 @@
+import os
+import re
+import json
+import time
+import random
+import asyncio
+import logging
+import threading
+from abc import ABC, abstractmethod
+import aiohttp
+import openai
+import torch
+from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
+from pathlib import Path
+from dotenv import load_dotenv
+from backend.metrics_service import metrics
+
+logger = logging.getLogger(__name__)
+
+env_path = Path(__file__).resolve().parent.parent / ".env"
+logger.debug("Looking for .env file at: %s", env_path)
+
+load_dotenv(dotenv_path=env_path, override=True)
+
+
+class RewriteBackend(ABC):
+    """Interface for the candidate generators used by SentenceGenerator."""
+    name = None
+
+    def is_available(self):
+        """Whether the backend can currently be used."""
+        return True
+
+    @abstractmethod
+    def generate_batch(self, seeds, target_emotions, batch_size):
+        """
+        Generate rewrite candidates for the given seed sentences.
+        :param seeds: Sentences to rewrite (the original or the best candidates so far).
+        :param target_emotions: The user's top target emotions {label: score}.
+        :param batch_size: Total number of candidates to generate across all seeds.
+        :return: List of candidate sentences.
+        """
+
+
+class OpenAIRewriteBackend(RewriteBackend):
+    name = "openai"
+
+    def __init__(self, model_name="gpt-4.1-nano", max_tokens=150):
+        """
+        Rewrite sentences with the OpenAI chat-completion API.
+        :param model_name: The name of the OpenAI model to use.
+        :param max_tokens: Maximum tokens for the generated response.
+        """
+        self.model_name = model_name
+        self.max_tokens = max_tokens
+        self.max_concurrent_requests = 24
+        # "n" asks for several completions per request, "json_array" for a list of
+        # rewrites in one completion; None sends one request per candidate
+        self.multi_completion_mode = "n"
+        self.candidates_per_request = 10
+        self.api_key = os.getenv("OPENAI_API_KEY", "").strip().replace('\ufeff', '')
+        if self.api_key.startswith("sk-"):
+            openai.api_key = self.api_key
+        else:
+            logger.warning("No valid OPENAI_API_KEY found, the OpenAI rewrite backend is disabled")
+
+    def is_available(self):
+        return self.api_key.startswith("sk-")
+
+    def generate_batch(self, seeds, target_emotions, batch_size):
+        if not self.is_available():
+            raise Exception("Invalid API key loaded")
+        # Use a try/except to catch interpreter shutdown or event loop errors
+        try:
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            try:
+                return loop.run_until_complete(
+                    self._generate_sentences_batch(seeds, target_emotions, batch_size)
+                )
+            finally:
+                loop.close()
+        except RuntimeError as e:
+            # Handle interpreter shutdown or event loop closed errors gracefully
+            if "cannot schedule new futures after interpreter shutdown" in str(e) or "Event loop is closed" in str(e):
+                logger.error("Server interpreter has shut down or event loop is closed. Cannot process further requests.")
+                raise Exception("Server is shutting down or restarting. Please try again later.")
+            else:
+                raise
+
+    async def _generate_sentence_with_retry(self, session, sentence, user_top_emotions, semaphore, retries=2):
+        for attempt in range(retries + 1):
+            try:
+                async with semaphore:
+                    return await asyncio.wait_for(
+                        self._generate_sentence_async(session, sentence, user_top_emotions),
+                        timeout=40
+                    )
+            except Exception as e:
+                if attempt < retries:
+                    metrics.increment("llm_retries")
+                    logger.warning("Retrying sentence generation (attempt %d) due to error: %s", attempt + 2, e)
+                    await asyncio.sleep(1)
+                else:
+                    metrics.increment("llm_failures")
+                    logger.warning("Failed to generate sentence after %d attempts: %s", retries + 1, e)
+                    return sentence  # fallback to original
+
+    async def _generate_candidates_with_retry(self, session, sentence, user_top_emotions, count, semaphore, retries=1):
+        """Generate `count` candidates in one request, topping up with single requests on failure."""
+        candidates = []
+        if self.multi_completion_mode and count > 1:
+            for attempt in range(retries + 1):
+                try:
+                    async with semaphore:
+                        candidates = await asyncio.wait_for(
+                            self._generate_candidates_async(session, sentence, user_top_emotions, count),
+                            timeout=40
+                        )
+                    break
+                except Exception as e:
+                    metrics.increment("llm_retries")
+                    logger.warning("Multi-candidate generation failed (attempt %d): %s", attempt + 1, e)
+        
+        missing = count - len(candidates)
+        if missing > 0:
+            if self.multi_completion_mode and count > 1:
+                metrics.increment("llm_single_fallbacks")
+                logger.warning("Falling back to %d single requests", missing)
+            candidates += await asyncio.gather(*[
+                self._generate_sentence_with_retry(session, sentence, user_top_emotions, semaphore)
+                for _ in range(missing)
+            ])
+        metrics.increment("llm_candidates", len(candidates))
+        return candidates
+
+    async def _generate_sentences_batch(self, sentences, user_top_emotions, batch_size):
+        """Generate multiple sentences concurrently, several candidates per request"""
+        sentences_per_source = max(1, batch_size // len(sentences))  # Distribute batch size evenly
+        total_sentences = len(sentences) * sentences_per_source
+        logger.debug("Generating %d sentences (using %d seed sentences)...", total_sentences, len(sentences))
+        
+        semaphore = asyncio.Semaphore(self.max_concurrent_requests)
+        async with aiohttp.ClientSession() as session:
+            tasks = []
+            for sentence in sentences:
+                remaining = sentences_per_source
+                while remaining > 0:
+                    count = min(remaining, self.candidates_per_request) if self.multi_completion_mode else 1
+                    tasks.append(
+                        self._generate_candidates_with_retry(session, sentence, user_top_emotions, count, semaphore)
+                    )
+                    remaining -= count
+            completed = []
+            errors = 0
+            for task in asyncio.as_completed(tasks):
+                try:
+                    completed.extend(await task)
+                except Exception as e:
+                    errors += 1
+                    logger.warning("Error in sentence generation: %s", e)
+            logger.debug("Batch complete: %d generated in %d requests, %d errors.", len(completed), len(tasks), errors)
+            return completed
+
+    def _build_messages(self, original_sentence, target_emotions, count=1):
+        """Build the chat messages asking for `count` rewrites of the sentence."""
+        # Format target emotions to two decimals for the prompt
+        formatted_target = {k: round(v, 2) for k, v in target_emotions.items()}
+        prompt = (
+            f"Below is the original sentence:\n\"{original_sentence}\"\n\n"
+            f"The new desired emotion levels are:\n{json.dumps(formatted_target, indent=2)}\n\n"
+        )
+        prompt += (
+            "Your task is to rewrite the original sentence to reflect the specified emotional levels as closely as possible. "
+            "The rewritten sentence should:\n"
+            "1. Retain the original context and meaning.\n"
+            "2. Be similar in length to the original sentence.\n"
+            "3. Match the top three emotions provided in the target emotional levels.\n"
+            "4. Adjust the tone and word choice to align with the specified emotions without introducing new ideas.\n\n"
+            "Important Notes:\n"
+            "- Focus on the top three emotions with the highest values in the target emotional levels.\n"
+            "- Ensure the sentence remains grammatically correct and natural.\n"
+            "- Avoid exaggerating or diminishing the emotional tone beyond the specified levels.\n\n"
+            "- Avoid clichés, overused phrases and direct names of emotions.\n"
+        )
+        if count == 1:
+            prompt += (
+                "Output Format:\n"
+                "Return your output strictly as a JSON object with one key 'sentence'. For example:\n"
+                "{\"sentence\": \"Your generated sentence here\"}\n"
+                "Do not include any additional text, explanation, or formatting outside the JSON object."
+            )
+        else:
+            prompt += (
+                f"- Write {count} distinct rewrites that differ from each other in wording.\n\n"
+                "Output Format:\n"
+                f"Return your output strictly as a JSON object with one key 'sentences' holding a list of {count} strings. For example:\n"
+                "{\"sentences\": [\"First rewrite here\", \"Second rewrite here\"]}\n"
+                "Do not include any additional text, explanation, or formatting outside the JSON object."
+            )
+        
+        return [
+            {"role": "system", "content": "You are a highly skilled assistant specializing in rewriting sentences to convey specific emotional tones with precision."},
+            {"role": "user", "content": prompt}
+        ]
+
+    async def _post_chat_completion(self, session, messages, n=1, max_tokens=None):
+        """Send one chat-completion request and return the content of every choice."""
+        payload = {
+            "model": self.model_name,
+            "messages": messages,
+            "max_tokens": max_tokens or self.max_tokens
+        }
+        if n > 1:
+            payload["n"] = n
+        
+        metrics.increment("llm_requests")
+        llm_start = time.perf_counter()
+        async with session.post(
+            "https://api.openai.com/v1/chat/completions",
+            headers={"Authorization": f"Bearer {self.api_key}"},
+            json=payload
+        ) as response:
+            response_json = await response.json()
+        metrics.observe("llm_call", time.perf_counter() - llm_start)
+        
+        if response_json.get("error"):
+            raise Exception(response_json["error"].get("message", "OpenAI request failed"))
+        return [choice["message"]["content"].strip() for choice in response_json.get("choices", [])]
+
+    def _parse_candidates(self, response_text):
+        """
+        Extract rewritten sentences from a model response. Accepts a JSON object
+        with 'sentence' or 'sentences', a bare JSON list, or JSON wrapped in a code fence.
+        """
+        text = response_text.strip()
+        if text.startswith("```"):
+            text = text.strip("`")
+            if text.lower().startswith("json"):
+                text = text[4:]
+        try:
+            parsed = json.loads(text)
+        except json.JSONDecodeError:
+            # Fall back to the outermost JSON object or list inside the text
+            starts = [i for i in (text.find("{"), text.find("[")) if i != -1]
+            if not starts:
+                return []
+            start = min(starts)
+            end = max(text.rfind("}"), text.rfind("]"))
+            try:
+                parsed = json.loads(text[start:end + 1])
+            except json.JSONDecodeError:
+                return []
+        
+        if isinstance(parsed, dict):
+            parsed = parsed.get("sentences", [parsed.get("sentence")])
+        if not isinstance(parsed, list):
+            parsed = [parsed]
+        
+        candidates = []
+        for item in parsed:
+            if isinstance(item, dict):
+                item = item.get("sentence")
+            if isinstance(item, str) and item.strip():
+                candidates.append(item.strip())
+        return candidates
+
+    async def _generate_sentence_async(self, session, original_sentence, target_emotions):
+        """Async version of sentence generation"""
+        messages = self._build_messages(original_sentence, target_emotions)
+        contents = await self._post_chat_completion(session, messages)
+        if not contents:
+            # Let the retry wrapper retry and eventually fall back to the original
+            raise ValueError("OpenAI response contained no choices")
+        try:
+            return self._parse_candidates(contents[0])[0]
+        except Exception as e:
+            logger.warning("Error parsing OpenAI response: %s", e)
+            return original_sentence
+
+    async def _generate_candidates_async(self, session, original_sentence, target_emotions, count):
+        """Request `count` candidates with a single chat-completion call."""
+        if self.multi_completion_mode == "json_array":
+            messages = self._build_messages(original_sentence, target_emotions, count=count)
+            contents = await self._post_chat_completion(session, messages, max_tokens=self.max_tokens * count)
+        else:
+            messages = self._build_messages(original_sentence, target_emotions)
+            contents = await self._post_chat_completion(session, messages, n=count)
+        
+        candidates = []
+        for content in contents:
+            candidates.extend(self._parse_candidates(content))
+        return candidates[:count]
+
+
+# Small emotion lexicon for the offline backend: sentence openers, adjectives
+# that can be swapped between emotions, and the preferred sentence ending.
+EMOTION_LEXICON = {
+    'admiration': {'openers': ["Impressively", "Remarkably"], 'words': ["impressive", "remarkable", "brilliant", "admirable"], 'ending': "."},
+    'amusement': {'openers': ["Funnily enough", "Hilariously"], 'words': ["funny", "hilarious", "amusing", "comical"], 'ending': "!"},
+    'anger': {'openers': ["Furiously", "Outrageously"], 'words': ["furious", "outrageous", "infuriating", "angry"], 'ending': "!"},
+    'annoyance': {'openers': ["Annoyingly", "Irritatingly"], 'words': ["annoying", "irritating", "tiresome", "bothersome"], 'ending': "."},
+    'approval': {'openers': ["Rightly", "Fair enough"], 'words': ["good", "fine", "sensible", "acceptable"], 'ending': "."},
+    'caring': {'openers': ["Gently", "With care"], 'words': ["gentle", "kind", "thoughtful", "supportive"], 'ending': "."},
+    'confusion': {'openers': ["Strangely", "Puzzlingly"], 'words': ["confusing", "puzzling", "unclear", "strange"], 'ending': "?"},
+    'curiosity': {'openers': ["Curiously", "Interestingly"], 'words': ["curious", "interesting", "intriguing", "fascinating"], 'ending': "?"},
+    'desire': {'openers': ["Longingly", "Eagerly"], 'words': ["desirable", "tempting", "appealing", "irresistible"], 'ending': "."},
+    'disappointment': {'openers': ["Disappointingly", "Unfortunately"], 'words': ["disappointing", "underwhelming", "lacking", "mediocre"], 'ending': "."},
+    'disapproval': {'openers': ["Regrettably", "Unacceptably"], 'words': ["wrong", "unacceptable", "improper", "bad"], 'ending': "."},
+    'disgust': {'openers': ["Disgustingly", "Revoltingly"], 'words': ["disgusting", "revolting", "gross", "vile"], 'ending': "."},
+    'embarrassment': {'openers': ["Embarrassingly", "Awkwardly"], 'words': ["embarrassing", "awkward", "humiliating", "mortifying"], 'ending': "."},
+    'excitement': {'openers': ["Excitingly", "Wow"], 'words': ["exciting", "thrilling", "amazing", "electrifying"], 'ending': "!"},
+    'fear': {'openers': ["Frighteningly", "Alarmingly"], 'words': ["scary", "frightening", "terrifying", "alarming"], 'ending': "."},
+    'gratitude': {'openers': ["Thankfully", "Gratefully"], 'words': ["grateful", "thankful", "appreciated", "welcome"], 'ending': "."},
+    'grief': {'openers': ["Tragically", "Heartbreakingly"], 'words': ["tragic", "heartbreaking", "devastating", "mournful"], 'ending': "."},
+    'joy': {'openers': ["Happily", "Joyfully"], 'words': ["happy", "joyful", "wonderful", "delightful"], 'ending': "!"},
+    'love': {'openers': ["Lovingly", "Fondly"], 'words': ["lovely", "beloved", "adorable", "dear"], 'ending': "."},
+    'nervousness': {'openers': ["Nervously", "Anxiously"], 'words': ["nervous", "anxious", "uneasy", "tense"], 'ending': "."},
+    'optimism': {'openers': ["Hopefully", "Optimistically"], 'words': ["hopeful", "promising", "bright", "encouraging"], 'ending': "."},
+    'pride': {'openers': ["Proudly", "Triumphantly"], 'words': ["proud", "accomplished", "triumphant", "honored"], 'ending': "."},
+    'realization': {'openers': ["Suddenly", "As it turns out"], 'words': ["obvious", "clear", "evident", "apparent"], 'ending': "."},
+    'relief': {'openers': ["Luckily", "Finally"], 'words': ["relieved", "reassuring", "calming", "comforting"], 'ending': "."},
+    'remorse': {'openers': ["Sorrily", "Regretfully"], 'words': ["sorry", "regretful", "apologetic", "ashamed"], 'ending': "."},
+    'sadness': {'openers': ["Sadly", "Sorrowfully"], 'words': ["sad", "gloomy", "unhappy", "miserable"], 'ending': "."},
+    'surprise': {'openers': ["Surprisingly", "Unexpectedly"], 'words': ["surprising", "unexpected", "astonishing", "shocking"], 'ending': "!"},
+    'neutral': {'openers': [], 'words': ["normal", "ordinary", "usual", "typical"], 'ending': "."},
+}
+
+
+class LexiconRewriteBackend(RewriteBackend):
+    name = "lexicon"
+
+    def __init__(self, lexicon=EMOTION_LEXICON, seed=None):
+        """
+        Offline backend that steers a sentence towards the target emotions by
+        swapping emotion-laden adjectives, adding an emotional opener and
+        adjusting the final punctuation. Needs no model and no network.
+        """
+        self.lexicon = lexicon
+        self.rng = random.Random(seed)
+        self._word_emotion = {
+            word: emotion
+            for emotion, entry in lexicon.items()
+            for word in entry['words']
+        }
+        openers = sorted(
+            (opener for entry in lexicon.values() for opener in entry['openers']),
+            key=len, reverse=True
+        )
+        self._opener_pattern = re.compile(
+            r"^(?:" + "|".join(re.escape(o) for o in openers) + r"),\s*", re.IGNORECASE
+        )
+
+    def generate_batch(self, seeds, target_emotions, batch_size):
+        per_seed = max(1, batch_size // len(seeds))
+        return [self.tune(seed, target_emotions) for seed in seeds for _ in range(per_seed)]
+
+    def tune(self, sentence, target_emotions):
+        """Produce one emotion-steered variant of the sentence."""
+        targets = [e for e in target_emotions if e in self.lexicon and target_emotions[e] > 0]
+        if not targets:
+            return sentence
+        weights = [target_emotions[e] for e in targets]
+        emotion = self.rng.choices(targets, weights=weights)[0]
+        entry = self.lexicon[emotion]
+
+        # Swap adjectives that belong to other emotions
+        def replace(match):
+            word = match.group(0)
+            source = self._word_emotion.get(word.lower())
+            if source is None or source in targets:
+                return word
+            new_word = self.rng.choice(entry['words'])
+            return new_word.capitalize() if word[0].isupper() else new_word
+        text = re.sub(r"[A-Za-z']+", replace, sentence.strip())
+
+        # Replace or add an emotional opener
+        text = self._opener_pattern.sub("", text)
+        if entry['openers'] and self.rng.random() < 0.7:
+            if text[:1].isupper() and text[1:2].islower():
+                text = text[0].lower() + text[1:]
+            text = f"{self.rng.choice(entry['openers'])}, {text}"
+        elif text:
+            text = text[0].upper() + text[1:]
+
+        # Match the final punctuation to the emotion
+        if self.rng.random() < 0.5:
+            text = text.rstrip(".!?") + entry['ending']
+        return text
+
+
+class ParaphraseRewriteBackend(RewriteBackend):
+    name = "paraphrase"
+    # Loaded models are shared between instances, like EmotionAnalyzer does
+    _models = {}
+    _load_lock = threading.Lock()
+
+    def __init__(self, model_name="humarin/chatgpt_paraphraser_on_T5_base", device=None, max_length=128):
+        """
+        Offline backend using a small seq2seq paraphraser from transformers.
+        Half of the paraphrases are additionally steered with the lexicon backend.
+        The checkpoint is only loaded from the local Hugging Face cache, so download
+        it ahead of time (e.g. `huggingface-cli download <model_name>`).
+        :param model_name: Hugging Face seq2seq paraphrase model.
+        :param device: torch device, shared with the emotion analyzer.
+        """
+        self.model_name = model_name
+        self.device = device or torch.device("cpu")
+        self.max_length = max_length
+        self.tuner = LexiconRewriteBackend()
+
+    def is_available(self):
+        """Whether the paraphrase checkpoint can be loaded from the local model cache."""
+        try:
+            self._load_model()
+        except OSError as e:
+            logger.warning("Paraphrase model '%s' is not available locally: %s", self.model_name, e)
+            return False
+        return True
+
+    def _load_model(self):
+        """Load the paraphrase model only once per process, never downloading it during a request"""
+        with ParaphraseRewriteBackend._load_lock:
+            if self.model_name not in ParaphraseRewriteBackend._models:
+                logger.info("Loading paraphrase model '%s'...", self.model_name)
+                tokenizer = AutoTokenizer.from_pretrained(self.model_name, local_files_only=True)
+                model = AutoModelForSeq2SeqLM.from_pretrained(self.model_name, local_files_only=True).to(self.device)
+                model.eval()
+                ParaphraseRewriteBackend._models[self.model_name] = (tokenizer, model)
+            return ParaphraseRewriteBackend._models[self.model_name]
+
+    def generate_batch(self, seeds, target_emotions, batch_size):
+        tokenizer, model = self._load_model()
+        per_seed = max(1, batch_size // len(seeds))
+        num_paraphrases = max(1, (per_seed + 1) // 2)
+
+        inputs = tokenizer(
+            [f"paraphrase: {seed}" for seed in seeds],
+            return_tensors="pt", padding=True, truncation=True, max_length=self.max_length
+        ).to(self.device)
+        with torch.no_grad():
+            outputs = model.generate(
+                **inputs,
+                do_sample=True,
+                top_p=0.95,
+                temperature=0.9,
+                num_return_sequences=num_paraphrases,
+                max_length=self.max_length
+            )
+        paraphrases = tokenizer.batch_decode(outputs, skip_special_tokens=True)
+
+        # Keep every paraphrase plus an emotion-steered variant of it
+        candidates = []
+        for paraphrase in paraphrases:
+            candidates.append(paraphrase)
+            candidates.append(self.tuner.tune(paraphrase, target_emotions))
+        return candidates
@@ -0,0 +1,177 @@
+import re
+import threading
+import gzip
+import hashlib
+import logging
+import mimetypes
+import posixpath
+from pathlib import Path
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip variants are always built
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Relative references that get rewritten to content-hashed names
+JS_IMPORT_PATTERN = re.compile(r"""(\bimport\s*\(?\s*|\bfrom\s+)(['"])(\.{1,2}/[^'"]+)\2""")
+CSS_URL_PATTERN = re.compile(r"""(url\(\s*)(['"]?)((?!data:|https?:|/)[^'")]+)\2""")
+HTML_REF_PATTERN = re.compile(r"""(\b(?:src|href)=)(["'])((?!data:|https?:|//|#)[^"']+)\2""")
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+
+class _Asset:
+    def __init__(self, body, mimetype, cache_control):
+        self.mimetype = mimetype
+        self.cache_control = cache_control
+        self.digest = hashlib.sha256(body).hexdigest()
+        # Encoding -> precompressed body; only kept when it actually saves bytes
+        self.variants = {'identity': body}
+        gzipped = gzip.compress(body, compresslevel=9, mtime=0)
+        if len(gzipped) < len(body):
+            self.variants['gzip'] = gzipped
+        if brotli is not None:
+            compressed = brotli.compress(body, quality=11)
+            if len(compressed) < len(body):
+                self.variants['br'] = compressed
+
+    def etag(self, encoding):
+        # Strong ETags must differ between encodings of the same resource
+        return self.digest[:32] if encoding == 'identity' else f"{self.digest[:32]}-{encoding}"
+
+
+class StaticAssetManager:
+    def __init__(self, root_dir, extensions=(".js", ".css"), hash_length=10):
+        """
+        In-memory static asset layer with content-hashed file names.
+        At startup every JS/CSS file under root_dir is read, its relative imports
+        and url() references are rewritten to hashed names, and gzip/brotli
+        variants are precompressed once.
+        :param root_dir: Directory with the frontend files.
+        :param extensions: File types that are fingerprinted.
+        :param hash_length: Number of hex digits of the content hash in file names.
+        """
+        self.root_dir = Path(root_dir)
+        self.extensions = extensions
+        self.hash_length = hash_length
+        self.manifest = {}  # original relative path -> hashed relative path
+        self._assets = {}   # served relative path -> _Asset
+        self._rewritten = {}
+        self._source_mtimes = {}
+        self._build_lock = threading.Lock()
+        self.build()
+
+    def build(self):
+        """Scan the asset directory and rebuild the manifest and the compressed variants."""
+        self.manifest = {}
+        self._rewritten = {}
+        self._source_mtimes = self._scan_sources()
+
+        for rel_path in sorted(self._source_mtimes):
+            if rel_path != "index.html":
+                self._fingerprint(rel_path, set())
+
+        assets = {}
+        for original, hashed in self.manifest.items():
+            body = self._rewritten[original]
+            mimetype = self._mimetype(original)
+            assets[hashed] = _Asset(body, mimetype, IMMUTABLE_CACHE_CONTROL)
+            # Unhashed names stay reachable but must be revalidated
+            assets[original] = _Asset(body, mimetype, REVALIDATE_CACHE_CONTROL)
+
+        index_path = self.root_dir / "index.html"
+        if index_path.exists():
+            html = index_path.read_text(encoding="utf-8")
+            html = HTML_REF_PATTERN.sub(lambda m: self._replace_ref(m, ""), html)
+            assets["index.html"] = _Asset(html.encode("utf-8"), "text/html", REVALIDATE_CACHE_CONTROL)
+
+        # Swap in the new assets at once so concurrent requests never see a partial build
+        self._assets = assets
+        logger.info("Built static asset manifest with %d files", len(self.manifest))
+
+    def refresh(self):
+        """Rebuild if a source file was added, removed or modified since the last build (for development)."""
+        if self._scan_sources() == self._source_mtimes:
+            return False
+        with self._build_lock:
+            if self._scan_sources() != self._source_mtimes:
+                logger.info("Frontend files changed, rebuilding static assets")
+                self.build()
+        return True
+
+    def _scan_sources(self):
+        """Modification times of every fingerprinted file and index.html, by relative path."""
+        mtimes = {}
+        for path in self.root_dir.rglob("*"):
+            if path.is_file() and (path.suffix in self.extensions or path == self.root_dir / "index.html"):
+                mtimes[path.relative_to(self.root_dir).as_posix()] = path.stat().st_mtime_ns
+        return mtimes
+
+    def _fingerprint(self, rel_path, visiting):
+        """Rewrite references of an asset, then name it after the hash of the result."""
+        if rel_path in self.manifest:
+            return self.manifest[rel_path]
+        if rel_path in visiting:
+            return None  # Import cycle: keep the plain name for this reference
+        visiting.add(rel_path)
+
+        text = (self.root_dir / rel_path).read_text(encoding="utf-8")
+        base_dir = posixpath.dirname(rel_path)
+        pattern = CSS_URL_PATTERN if rel_path.endswith(".css") else JS_IMPORT_PATTERN
+        text = pattern.sub(lambda m: self._replace_ref(m, base_dir, visiting), text)
+        body = text.encode("utf-8")
+
+        stem, ext = posixpath.splitext(rel_path)
+        digest = hashlib.sha256(body).hexdigest()[:self.hash_length]
+        hashed = f"{stem}.{digest}{ext}"
+        self._rewritten[rel_path] = body
+        self.manifest[rel_path] = hashed
+        visiting.discard(rel_path)
+        return hashed
+
+    def _replace_ref(self, match, base_dir, visiting=None):
+        prefix, quote, ref = match.group(1), match.group(2), match.group(3)
+        target = posixpath.normpath(posixpath.join(base_dir, ref))
+        if not (self.root_dir / target).is_file() or posixpath.splitext(target)[1] not in self.extensions:
+            return match.group(0)
+        hashed = self._fingerprint(target, visiting if visiting is not None else set())
+        if hashed is None:
+            return match.group(0)
+        new_ref = posixpath.relpath(hashed, base_dir or ".")
+        if ref.startswith("./") or ref.startswith("../"):
+            new_ref = new_ref if new_ref.startswith("../") else f"./{new_ref}"
+        return f"{prefix}{quote}{new_ref}{quote}"
+
+    def _mimetype(self, rel_path):
+        if rel_path.endswith(".js"):
+            return "text/javascript"
+        return mimetypes.guess_type(rel_path)[0] or "application/octet-stream"
+
+    def has(self, rel_path):
+        return rel_path in self._assets
+
+    def response(self, rel_path, request):
+        """Build a Flask response for an asset, honouring Accept-Encoding and If-None-Match."""
+        from flask import Response
+
+        asset = self._assets[rel_path]
+        encoding = 'identity'
+        for candidate in ('br', 'gzip'):
+            if candidate in asset.variants and request.accept_encodings[candidate] > 0:
+                encoding = candidate
+                break
+        etag = asset.etag(encoding)
+
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = Response(asset.variants[encoding], mimetype=asset.mimetype)
+            if encoding != 'identity':
+                response.headers["Content-Encoding"] = encoding
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = asset.cache_control
+        response.headers["Vary"] = "Accept-Encoding"
+        return response
@@ -7,6 +7,8 @@ export class DataService {
     this.aiEnabled = true;
     this.logger = new LoggingService(baseUrl);
     this.currentMode = 'dynamic'; // Default mode
+    this.responseFormat = 'compact'; // Ask /analyze for the packed score matrix
+    this.lastAnalysis = null; // { etag, data } of the last /analyze response
   }
   
   // Counter management
@@ -116,16 +118,31 @@ export class DataService {
     const startTime = performance.now();
     
     try {
+      const headers = { "Content-Type": "application/json" };
+      // Let the server answer 304 when the text has not changed since the last analysis
+      if (this.lastAnalysis) {
+        headers["If-None-Match"] = this.lastAnalysis.etag;
+      }
+
       const response = await fetch(`${this.baseUrl}/analyze`, {
         method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ text }),
+        headers,
+        body: JSON.stringify({ text, format: this.responseFormat }),
       });
 
-      const data = await response.json();
+      let data;
+      if (response.status === 304 && this.lastAnalysis) {
+        // Hand out a copy, callers mutate the results (e.g. originalEmotions)
+        data = structuredClone(this.lastAnalysis.data);
+      } else {
+        data = this.decodeAnalysis(await response.json());
 
-      if (!response.ok) {
-        throw new Error(data.error || `HTTP ${response.status}`);
+        if (!response.ok) {
+          throw new Error(data.error || `HTTP ${response.status}`);
+        }
+
+        const etag = response.headers.get("ETag");
+        this.lastAnalysis = etag ? { etag, data: structuredClone(data) } : null;
       }
 
       if (!data.results || !Array.isArray(data.results) || data.results.length === 0) {
@@ -162,6 +179,55 @@ export class DataService {
     }
   }
 
+  // Decode a compact /analyze response back into { results, structured_data }
+  decodeAnalysis(data) {
+    if (!data || data.format !== 'compact') return data;
+
+    const labels = data.labels;
+    const [rows, cols] = data.shape;
+    let scoreAt;
+    if (data.encoding === 'base64') {
+      const binary = atob(data.scores);
+      const bytes = new Uint8Array(binary.length);
+      for (let i = 0; i < binary.length; i++) bytes[i] = binary.charCodeAt(i);
+      const view = new DataView(bytes.buffer);
+      scoreAt = (row, col) => view.getFloat32((row * cols + col) * 4, true); // little-endian
+    } else {
+      scoreAt = (row, col) => data.scores[row][col];
+    }
+
+    const sentences = [];
+    const results = [];
+    for (let row = 0; row < rows; row++) {
+      const emotions = {};
+      for (let col = 0; col < cols; col++) {
+        emotions[labels[col]] = scoreAt(row, col);
+      }
+      const meta = data.sentences[row];
+      sentences.push({ ...meta, emotions });
+      results.push({
+        sentence: meta.sentence,
+        emotions: emotions,
+        paragraph_id: meta.paragraph_id
+      });
+    }
+
+    // Sentence texts are only sent once; restore them in the structured text
+    const structuredText = data.structured_text.map(element => (
+      element.sentences
+        ? { ...element, sentences: element.sentences.map(s => ({ ...s, text: data.sentences[s.id].sentence })) }
+        : element
+    ));
+
+    return {
+      results,
+      structured_data: {
+        structured_text: structuredText,
+        sentences
+      }
+    };
+  }
+
   async uploadFile(file) {
     const startTime = performance.now();
     
@@ -0,0 +1,23 @@
+from backend.admin_auth import is_admin_request
+from backend.profiling_service import ProfilingService
+
+
+def test_admin_requests_need_a_configured_matching_token(monkeypatch):
+    monkeypatch.delenv("ADMIN_TOKEN", raising=False)
+    assert not is_admin_request({"X-Admin-Token": ""})
+
+    monkeypatch.setenv("ADMIN_TOKEN", "secret")
+    assert is_admin_request({"X-Admin-Token": "secret"})
+    assert is_admin_request({"Authorization": "Bearer secret"})
+    assert not is_admin_request({"X-Admin-Token": "wrong"})
+    assert not is_admin_request({})
+
+
+def test_profile_header_is_ignored_by_default_and_without_token(monkeypatch):
+    monkeypatch.setenv("ADMIN_TOKEN", "secret")
+    profiler = ProfilingService()
+    assert not profiler.should_profile({"X-Profile": "1", "X-Admin-Token": "secret"})
+
+    profiler.configure(allow_header=True)
+    assert not profiler.should_profile({"X-Profile": "1"})
+    assert profiler.should_profile({"X-Profile": "1", "X-Admin-Token": "secret"})
@@ -0,0 +1,54 @@
+import pytest
+from backend.candidate_filter import CandidateDeduplicator
+
+TEMPLATE = ("When the results of the quarterly review were finally announced to the whole team, "
+            "everyone in the room felt {} about it.")
+
+
+def test_single_emotion_word_variants_are_kept():
+    dedup = CandidateDeduplicator()
+    candidates = [TEMPLATE.format(word) for word in ("happy", "furious", "anxious")]
+    kept, stats = dedup.filter(candidates)
+    assert kept == candidates
+    assert stats == {'exact': 0, 'near': 0}
+
+
+def test_exact_and_near_exact_copies_are_collapsed():
+    dedup = CandidateDeduplicator()
+    sentence = TEMPLATE.format("happy")
+    candidates = [sentence, sentence.upper(), sentence.replace(",", ""), TEMPLATE.format("furious")]
+    kept, stats = dedup.filter(candidates)
+    assert kept == [sentence, TEMPLATE.format("furious")]
+    assert stats == {'exact': 2, 'near': 0}
+
+    long_sentence = " ".join(f"word{i}" for i in range(100))
+    kept, stats = dedup.filter([long_sentence, long_sentence + " again"])
+    assert kept == [long_sentence]
+    assert stats['near'] == 1
+
+
+def test_seed_copies_never_displace_variants():
+    dedup = CandidateDeduplicator()
+    seed = TEMPLATE.format("happy")
+    variant = TEMPLATE.format("furious")
+    kept, stats = dedup.filter([seed, seed, variant, seed], seeds=[seed])
+    assert kept == [variant, seed]
+    assert stats['exact'] == 2
+
+
+def test_select_diverse_keeps_word_level_variants():
+    dedup = CandidateDeduplicator()
+    ranked = [TEMPLATE.format("happy"), TEMPLATE.format("happy") + "!", TEMPLATE.format("anxious")]
+    assert dedup.select_diverse(ranked, 2) == [TEMPLATE.format("happy"), TEMPLATE.format("anxious")]
+
+
+def test_lexicon_rewrites_survive_filtering():
+    rewrite_backends = pytest.importorskip("backend.rewrite_backends")
+    seed = TEMPLATE.format("happy")
+    batch = rewrite_backends.LexiconRewriteBackend(seed=1).generate_batch(
+        [seed] * 3, {'anger': 0.6, 'fear': 0.3, 'sadness': 0.1}, 48
+    )
+    dedup = CandidateDeduplicator()
+    kept, _ = dedup.filter(batch, seeds=[seed])
+    assert len(kept) == len({dedup.normalize(candidate) for candidate in batch})
+    assert dedup.normalize(kept[0]) != dedup.normalize(seed)
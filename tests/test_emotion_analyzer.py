@@ -0,0 +1,64 @@
+import threading
+from collections import OrderedDict
+from types import SimpleNamespace
+import pytest
+
+torch = pytest.importorskip("torch")
+emotion_analyzer = pytest.importorskip("backend.emotion_analyzer")
+from backend.metrics_service import metrics
+
+
+class _StubTokenizer:
+    def __call__(self, sentences, **kwargs):
+        return _StubInputs(torch.tensor([[float(len(s))] for s in sentences]))
+
+
+class _StubInputs(dict):
+    def __init__(self, lengths):
+        super().__init__(lengths=lengths)
+
+    def to(self, device):
+        return self
+
+
+class _StubModel:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, lengths):
+        self.calls += 1
+        return SimpleNamespace(logits=torch.cat([lengths, -lengths], dim=1))
+
+
+def _analyzer(cache_size=10):
+    # Bypass __init__ so no spaCy or Hugging Face model is loaded
+    analyzer = emotion_analyzer.EmotionAnalyzer.__new__(emotion_analyzer.EmotionAnalyzer)
+    analyzer.device = torch.device("cpu")
+    analyzer.batch_size = 2
+    analyzer.cache_size = cache_size
+    analyzer._score_cache = OrderedDict()
+    analyzer._cache_lock = threading.Lock()
+    analyzer._model_lock = threading.Lock()
+    analyzer.tokenizer = _StubTokenizer()
+    analyzer.model = _StubModel()
+    analyzer.emotion_labels = ["joy", "sadness"]
+    return analyzer
+
+
+def test_score_cache_counts_distinct_sentences_and_stays_bounded(monkeypatch):
+    monkeypatch.setattr(emotion_analyzer.EmotionAnalyzer, "_is_model_loaded", True)
+    metrics.reset()
+    analyzer = _analyzer(cache_size=2)
+
+    scores = analyzer._score_rows(["a", "a", "bb"])
+    assert scores.shape == (3, 2)
+    assert torch.equal(scores[0], scores[1])
+    assert metrics.get_counter("analyzer_cache_hits") == 0
+    assert metrics.get_counter("analyzer_cache_misses") == 2
+
+    analyzer._score_rows(["a", "ccc"])
+    assert metrics.get_counter("analyzer_cache_hits") == 1
+    assert list(analyzer._score_cache) == ["a", "ccc"]  # "bb" was least recently used
+
+    assert analyzer.score_sentences(["bb"])[0].keys() == {"joy", "sadness"}
+    assert "cache_lookup" not in metrics.snapshot()["stages"]
@@ -0,0 +1,93 @@
+import json
+import time
+import pytest
+from backend.job_queue import JobQueue
+
+
+class _StubAnalyzer:
+    """Splits on '.' and scores by sentence length, through the public analyzer API."""
+
+    def __init__(self):
+        self.batches = []
+
+    def segment_documents(self, texts):
+        structures = []
+        for text in texts:
+            parts = [p.strip() for p in text.split('.') if p.strip()]
+            structures.append({'sentences': [
+                {'sentence': p, 'paragraph_id': 0, 'sentence_id': i} for i, p in enumerate(parts)
+            ]})
+        return structures
+
+    def score_sentences(self, sentences):
+        self.batches.append(list(sentences))
+        return [{'joy': len(s) / 10} for s in sentences]
+
+    @staticmethod
+    def format_results(sentences):
+        return [{'sentence': s['sentence'], 'emotions': s['emotions'], 'paragraph_id': s['paragraph_id']} for s in sentences]
+
+
+def _wait_for(queue, job_id, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status = queue.get_status(job_id)
+        if status['status'] in ('completed', 'failed'):
+            return status
+        time.sleep(0.01)
+    raise AssertionError("job did not finish")
+
+
+def test_job_resumes_from_checkpoint_after_partial_write(tmp_path):
+    queue = JobQueue(_StubAnalyzer(), base_dir=tmp_path, batch_size=2)
+    status = queue.submit(["a. bb. ccc", {"id": "x", "text": "dd. e"}])
+
+    # Simulate a crash: one checkpointed sentence plus a half-written line
+    checkpoint = {'document': 0, 'sentences': [
+        {'sentence': 'a', 'paragraph_id': 0, 'sentence_id': 0, 'emotions': {'joy': 9}}
+    ]}
+    (tmp_path / status['id'] / "results.jsonl").write_text(json.dumps(checkpoint) + '\n{"docu')
+
+    queue.start()
+    final = _wait_for(queue, status['id'])
+    assert final['status'] == 'completed'
+    assert final['progress'] == {'processed': 2, 'total': 2, 'sentences_processed': 5}
+
+    results = queue.get_results(status['id'])
+    assert [r['id'] for r in results] == [0, "x"]
+    assert results[0]['results'][0]['emotions'] == {'joy': 9}  # Not recomputed
+    assert [r['sentence'] for r in results[1]['results']] == ["dd", "e"]
+
+
+def test_batches_span_documents_and_duplicates_are_read_once(tmp_path):
+    analyzer = _StubAnalyzer()
+    queue = JobQueue(analyzer, base_dir=tmp_path, batch_size=4)
+    status = queue.submit(["a", "bb. cc", "", "ddd", "e. f"])
+    queue.start()
+    final = _wait_for(queue, status['id'])
+    assert final['progress'] == {'processed': 5, 'total': 5, 'sentences_processed': 6}
+    assert [len(batch) for batch in analyzer.batches] == [4, 2]
+
+    # A second process resuming the same job appends the same sentences again
+    results_path = tmp_path / status['id'] / "results.jsonl"
+    results_path.write_text(results_path.read_text() * 2)
+    results = queue.get_results(status['id'])
+    assert [[r['sentence'] for r in doc['results']] for doc in results] == [["a"], ["bb", "cc"], [], ["ddd"], ["e", "f"]]
+
+
+def test_job_claimed_by_another_process_is_skipped(tmp_path):
+    fcntl = pytest.importorskip("fcntl")
+    analyzer = _StubAnalyzer()
+    queue = JobQueue(analyzer, base_dir=tmp_path)
+    status = queue.submit(["a. b"])
+    with open(tmp_path / status['id'] / "worker.lock", 'a') as other:
+        fcntl.flock(other.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        queue._run_job(status['id'])
+    assert analyzer.batches == []
+    assert queue.get_status(status['id'])['status'] == 'queued'
+
+
+def test_unknown_or_malformed_job_ids_are_rejected(tmp_path):
+    queue = JobQueue(_StubAnalyzer(), base_dir=tmp_path)
+    assert queue.get_status("../etc") is None
+    assert queue.get_results("deadbeef") is None
@@ -0,0 +1,15 @@
+import pytest
+from backend.profiling_service import ProfilingService
+
+
+def test_invalid_configuration_leaves_settings_untouched():
+    profiler = ProfilingService()
+    for update in ({'enabled': True, 'sample_rate': "abc"},
+                   {'enabled': True, 'sample_rate': 2},
+                   {'allow_header': "false"}):
+        with pytest.raises(ValueError):
+            profiler.configure(**update)
+        assert (profiler.enabled, profiler.sample_rate, profiler.allow_header) == (False, 0.0, False)
+
+    config = profiler.configure(enabled=True, sample_rate=0.25)
+    assert config['enabled'] is True and config['sample_rate'] == 0.25
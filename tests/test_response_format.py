@@ -0,0 +1,22 @@
+import json
+import numpy as np
+from backend.response_format import dumps, encode_score_matrix, to_compact
+
+
+def test_rounded_encoding_keeps_short_decimals():
+    matrix = np.array([[0.0147, 0.98765432]], dtype=np.float32)
+    assert json.loads(dumps(encode_score_matrix(matrix, "rounded"))) == [[0.0147, 0.9877]]
+
+
+def test_compact_sends_sentence_text_once():
+    structure = {
+        'sentences': [{'sentence': 'Hello there.', 'paragraph_id': 0, 'sentence_id': 0}],
+        'structured_text': [
+            {'type': 'paragraph', 'sentences': [{'id': 0, 'text': 'Hello there.'}], 'original_text': 'Hello there.'},
+            {'type': 'linebreak'}
+        ]
+    }
+    payload = to_compact(structure, ['joy'], np.array([[0.5]]))
+    assert payload['structured_text'][0]['sentences'] == [{'id': 0}]
+    assert payload['structured_text'][1] == {'type': 'linebreak'}
+    assert payload['sentences'][0]['sentence'] == 'Hello there.'
@@ -0,0 +1,104 @@
+import json
+import pytest
+
+for module in ("aiohttp", "openai", "torch", "transformers", "dotenv"):
+    pytest.importorskip(module)
+
+from backend import rewrite_backends
+from backend.metrics_service import metrics
+
+
+class _StubResponse:
+    def __init__(self, payload):
+        self.payload = payload
+
+    async def json(self):
+        return self.payload
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class _StubSession:
+    """Stands in for aiohttp.ClientSession and answers every POST with n JSON choices."""
+
+    def __init__(self):
+        self.requests = []
+
+    def post(self, url, headers=None, json=None):
+        self.requests.append(json)
+        n = json.get("n", 1)
+        choices = [
+            {"message": {"content": _dumps({"sentence": f"Rewrite {i}"})}}
+            for i in range(n)
+        ]
+        return _StubResponse({"choices": choices})
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+def _dumps(obj):
+    # StubSession.post's `json` keyword shadows the module there
+    return json.dumps(obj)
+
+
+def test_openai_backend_generates_candidates_with_stubbed_session(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    session = _StubSession()
+    monkeypatch.setattr(rewrite_backends.aiohttp, "ClientSession", lambda: session)
+    metrics.reset()
+
+    backend = rewrite_backends.OpenAIRewriteBackend()
+    candidates = backend.generate_batch(["I am fine."], {"joy": 0.8}, batch_size=4)
+
+    assert sorted(candidates) == ["Rewrite 0", "Rewrite 1", "Rewrite 2", "Rewrite 3"]
+    # One multi-completion request, no retries or single fallbacks
+    assert len(session.requests) == 1
+    assert session.requests[0]["n"] == 4
+    assert metrics.get_counter("llm_retries") == 0
+    assert metrics.get_counter("llm_single_fallbacks") == 0
+    assert metrics.snapshot()["stages"]["llm_call"]["count"] == 1
+
+
+def test_openai_backend_falls_back_to_original_without_choices(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    session = _StubSession()
+    session.post = lambda url, headers=None, json=None: _StubResponse({})
+    monkeypatch.setattr(rewrite_backends.aiohttp, "ClientSession", lambda: session)
+
+    async def no_sleep(delay):
+        return None
+    monkeypatch.setattr(rewrite_backends.asyncio, "sleep", no_sleep)
+
+    backend = rewrite_backends.OpenAIRewriteBackend()
+    backend.multi_completion_mode = None
+    assert backend.generate_batch(["I am fine."], {"joy": 0.8}, batch_size=2) == ["I am fine.", "I am fine."]
+
+
+def test_parse_candidates_accepts_lists_and_code_fences():
+    backend = rewrite_backends.OpenAIRewriteBackend.__new__(rewrite_backends.OpenAIRewriteBackend)
+    assert backend._parse_candidates('```json\n{"sentences": ["a", "b"]}\n```') == ["a", "b"]
+    assert backend._parse_candidates('Here: ["x", {"sentence": "y"}]') == ["x", "y"]
+    assert backend._parse_candidates("no json at all") == []
+
+
+def test_rewrite_backend_requires_generate_batch():
+    with pytest.raises(TypeError):
+        rewrite_backends.RewriteBackend()
+
+
+def test_paraphrase_backend_unavailable_without_local_checkpoint(monkeypatch):
+    def missing(*args, **kwargs):
+        assert kwargs.get("local_files_only") is True
+        raise OSError("not in cache")
+
+    monkeypatch.setattr(rewrite_backends.AutoTokenizer, "from_pretrained", missing)
+    backend = rewrite_backends.ParaphraseRewriteBackend(model_name="missing/paraphraser")
+    assert backend.is_available() is False
@@ -0,0 +1,22 @@
+import os
+from backend.static_assets import StaticAssetManager
+
+
+def test_refresh_picks_up_edited_frontend_files(tmp_path):
+    (tmp_path / "app.js").write_text("import './util.js';\n")
+    (tmp_path / "util.js").write_text("export const x = 1;\n")
+    (tmp_path / "index.html").write_text('<script src="app.js"></script>')
+    assets = StaticAssetManager(tmp_path)
+    old_util = assets.manifest["util.js"]
+    assert not assets.refresh()
+
+    util = tmp_path / "util.js"
+    util.write_text("export const x = 2;\n")
+    stat = util.stat()
+    os.utime(util, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert assets.refresh()
+
+    new_util = assets.manifest["util.js"]
+    assert new_util != old_util and assets.has(new_util)
+    assert new_util in assets._assets[assets.manifest["app.js"]].variants['identity'].decode()
+    assert assets.manifest["app.js"] in assets._assets["index.html"].variants['identity'].decode()